@@ -0,0 +1,160 @@
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_MISSING = object()
+
+
+class TwoTierCache(BaseCache):
+    """Небольшой LRU-кэш процесса (L1) перед общим кэшем (L2).
+
+    Запись и удаление идут в оба уровня, чтение - сначала из L1. Записи
+    живут в L1 не дольше LOCAL_TIMEOUT секунд, а ключи с префиксами из
+    BYPASS_PREFIXES (счетчики версий) читаются только из L2: изменения
+    из других процессов доходят через версионированные ключи сразу.
+
+    Параметры OPTIONS: SHARED - алиас общего кэша, MAX_ENTRIES - размер
+    L1, LOCAL_TIMEOUT, BYPASS_PREFIXES.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._max_local = options.get('MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._bypass = tuple(options.get('BYPASS_PREFIXES', ()))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def stats(self):
+        """Попадания и промахи по уровням с момента запуска процесса."""
+        return dict(self._stats)
+
+    def _cacheable(self, key):
+        return not key.startswith(self._bypass)
+
+    def _local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self._local_timeout
+        return min(timeout, self._local_timeout)
+
+    def _remember(self, key, value, version, timeout=DEFAULT_TIMEOUT):
+        ttl = self._local_ttl(timeout)
+        if not self._cacheable(key) or ttl <= 0:
+            return
+        local_key = self.make_key(key, version)
+        with self._lock:
+            self._local[local_key] = (time.monotonic() + ttl,
+                                      pickle.dumps(value))
+            self._local.move_to_end(local_key)
+            while len(self._local) > self._max_local:
+                self._local.popitem(last=False)
+
+    def _recall(self, key, version):
+        if not self._cacheable(key):
+            return _MISSING
+        local_key = self.make_key(key, version)
+        with self._lock:
+            entry = self._local.get(local_key)
+            if entry is None:
+                self._stats['l1_misses'] += 1
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._local[local_key]
+                self._stats['l1_misses'] += 1
+                return _MISSING
+            self._local.move_to_end(local_key)
+            self._stats['l1_hits'] += 1
+        return pickle.loads(value)
+
+    def _forget(self, keys, version):
+        with self._lock:
+            for key in keys:
+                self._local.pop(self.make_key(key, version), None)
+
+    def get(self, key, default=None, version=None):
+        value = self._recall(key, version)
+        if value is not _MISSING:
+            return value
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            self._stats['l2_misses'] += 1
+            return default
+        self._stats['l2_hits'] += 1
+        self._remember(key, value, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        remote = []
+        for key in keys:
+            value = self._recall(key, version)
+            if value is _MISSING:
+                remote.append(key)
+            else:
+                found[key] = value
+        if remote:
+            fetched = self.shared.get_many(remote, version)
+            self._stats['l2_hits'] += len(fetched)
+            self._stats['l2_misses'] += len(remote) - len(fetched)
+            for key, value in fetched.items():
+                self._remember(key, value, version)
+            found.update(fetched)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._remember(key, value, version, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            self._remember(key, value, version, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._remember(key, value, version, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._forget([key], version)
+        self.shared.delete(key, version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._forget(keys, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        if self._recall(key, version) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._forget([key], version)
+        return self.shared.incr(key, delta, version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,168 @@
+import hashlib
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_max_age, has_vary_header
+
+LOCK_KEY = 'coalesce:lock:{}'
+RESULT_KEY = 'coalesce:result:{}'
+CONDITIONAL_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+COALESCE_STATS = defaultdict(Counter)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class RequestCoalescingMiddleware:
+    """Склеивает одинаковые одновременные запросы гостей.
+
+    Внутри процесса первый запрос становится ведущим, остальные ждут его
+    ответ на threading.Event. Между процессами ведущий захватывает
+    блокировку в кэше и кладет туда ответ под своим токеном, так что
+    запросы других процессов получают ответ именно этого вычисления.
+    Если ответа нет дольше COALESCE_WAIT_TIMEOUT, запрос выполняется сам.
+    Личные ответы (CSRF-токен, сессия, сообщения, Vary: Cookie, private)
+    не делятся. Счетчики по именам маршрутов - в COALESCE_STATS.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, request):
+        if (request.method not in ('GET', 'HEAD')
+                or request.user.is_authenticated):
+            return self.get_response(request)
+        # Проверка входа сама читает сессию: личным ответ делают только
+        # обращения к сессии после нее
+        session = getattr(request, 'session', None)
+        if session is None:
+            return self._coalesce(request)
+        accessed, session.accessed = session.accessed, False
+        try:
+            return self._coalesce(request)
+        finally:
+            session.accessed = session.accessed or accessed
+
+    def _coalesce(self, request):
+        key = self._key(request)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            return self._follow(request, flight)
+        try:
+            return self._lead(request, key, flight)
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    @staticmethod
+    def _key(request):
+        parts = [request.method, request.get_full_path()]
+        parts.extend(request.META.get(name, '')
+                     for name in CONDITIONAL_HEADERS)
+        return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+    @staticmethod
+    def _stats(request):
+        # По имени маршрута, чтобы число записей не зависело от путей
+        try:
+            name = resolve(request.path_info).view_name
+        except Resolver404:
+            name = ''
+        return COALESCE_STATS[name]
+
+    def _lead(self, request, key, flight):
+        stats = self._stats(request)
+        token = uuid.uuid4().hex
+        lock = LOCK_KEY.format(key)
+        if not cache.add(lock, token, settings.COALESCE_LOCK_TIMEOUT):
+            result = self._wait_remote(lock)
+            if result is not None:
+                stats['coalesced_remote'] += 1
+                flight.result = result
+                return self._restore(result)
+            stats['timeouts'] += 1
+        stats['computed'] += 1
+        try:
+            response = self.get_response(request)
+            flight.result = self._snapshot(request, response)
+            if flight.result is not None:
+                cache.set(RESULT_KEY.format(token), flight.result,
+                          settings.COALESCE_RESULT_TIMEOUT)
+        finally:
+            if cache.get(lock) == token:
+                cache.delete(lock)
+        return response
+
+    def _follow(self, request, flight):
+        stats = self._stats(request)
+        if (flight.done.wait(settings.COALESCE_WAIT_TIMEOUT)
+                and flight.result is not None):
+            stats['coalesced'] += 1
+            return self._restore(flight.result)
+        stats['timeouts' if not flight.done.is_set() else 'computed'] += 1
+        return self.get_response(request)
+
+    @staticmethod
+    def _wait_remote(lock):
+        deadline = time.monotonic() + settings.COALESCE_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            token = cache.get(lock)
+            if token is None:
+                return None
+            result = cache.get(RESULT_KEY.format(token))
+            if result is not None:
+                return result
+            time.sleep(0.05)
+        return None
+
+    @staticmethod
+    def _personal(request, response):
+        """Ответ зависит от самого запроса: CSRF-cookie, сессия
+        и сообщения дописываются внешними middleware уже после нас."""
+        session = getattr(request, 'session', None)
+        messages = getattr(request, '_messages', None)
+        cache_control = response.get('Cache-Control', '')
+        return (
+            request.META.get('CSRF_COOKIE_USED')
+            or (session is not None and session.accessed)
+            or (messages is not None and messages.used)
+            or has_vary_header(response, 'Cookie')
+            or 'private' in cache_control
+            or 'no-cache' in cache_control
+            or get_max_age(response) == 0
+        )
+
+    @classmethod
+    def _snapshot(cls, request, response):
+        # Делить можно только готовый общий ответ без cookie
+        if (response.status_code not in (200, 304) or response.streaming
+                or response.cookies or cls._personal(request, response)):
+            return None
+        return {
+            'content': response.content,
+            'status': response.status_code,
+            'headers': list(response.items()),
+        }
+
+    @staticmethod
+    def _restore(result):
+        response = HttpResponse(result['content'], status=result['status'])
+        for header, value in result['headers']:
+            response[header] = value
+        return response
@@ -0,0 +1,53 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from ..cache import TwoTierCache
+
+
+def make_cache(**options):
+    options.setdefault('SHARED', 'shared')
+    return TwoTierCache(None, {'OPTIONS': options})
+
+
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_local_tier_serves_repeated_reads(self):
+        """Повторное чтение обслуживается локальным уровнем"""
+        cache = make_cache()
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        caches['shared'].delete('key')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.stats(), {'l1_hits': 2})
+
+    def test_local_tier_is_bounded(self):
+        """Локальный уровень вытесняет давно не читанные ключи"""
+        cache = make_cache(MAX_ENTRIES=2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get('a')
+        cache.set('c', 3)
+        caches['shared'].clear()
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+        self.assertEqual(cache.stats()['l2_misses'], 1)
+
+    def test_versions_propagate_between_processes(self):
+        """Версии читаются из общего уровня и сразу видны другим процессам"""
+        first = make_cache(BYPASS_PREFIXES=('version:',))
+        second = make_cache(BYPASS_PREFIXES=('version:',))
+        first.set('version:feed', 1)
+        self.assertEqual(second.get('version:feed'), 1)
+        first.incr('version:feed')
+        self.assertEqual(second.get('version:feed'), 2)
+        self.assertEqual(second.stats(), {'l2_hits': 2})
+
+    def test_delete_and_clear_reach_both_tiers(self):
+        """Удаление и очистка действуют на оба уровня"""
+        cache = make_cache()
+        cache.set_many({'a': 1, 'b': 2})
+        cache.delete('a')
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNone(caches['shared'].get('b'))
@@ -0,0 +1,156 @@
+import threading
+import time
+
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..middleware import (COALESCE_STATS, LOCK_KEY, RESULT_KEY,
+                          RequestCoalescingMiddleware)
+
+PATH = '/posts/1/'
+VIEW_NAME = 'posts:post_detail'
+
+
+@override_settings(COALESCE_WAIT_TIMEOUT=2)
+class RequestCoalescingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        COALESCE_STATS.clear()
+        self.calls = 0
+        self.release = threading.Event()
+
+    def view(self, request):
+        self.calls += 1
+        self.release.wait(2)
+        return HttpResponse(f'ответ {self.calls}')
+
+    def request(self, **extra):
+        request = RequestFactory().get(PATH, **extra)
+        request.user = AnonymousUser()
+        return request
+
+    def test_concurrent_requests_are_coalesced(self):
+        """Одновременные одинаковые запросы выполняются один раз"""
+        middleware = RequestCoalescingMiddleware(self.view)
+        responses = []
+
+        def run():
+            responses.append(middleware(self.request()))
+
+        threads = [threading.Thread(target=run) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # Ведущий занят, остальные успевают встать в ожидание
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(
+            {response.content for response in responses},
+            {'ответ 1'.encode()},
+        )
+        self.assertEqual(COALESCE_STATS[VIEW_NAME]['coalesced'], 4)
+
+    def test_other_worker_result_is_reused(self):
+        """Ответ ведущего из другого процесса берется из кэша"""
+        middleware = RequestCoalescingMiddleware(self.view)
+        key = middleware._key(self.request())
+        cache.set(LOCK_KEY.format(key), 'token')
+        cache.set(RESULT_KEY.format('token'), {
+            'content': b'remote', 'status': 200, 'headers': []})
+        response = middleware(self.request())
+        self.assertEqual(response.content, b'remote')
+        self.assertEqual(self.calls, 0)
+        self.assertEqual(COALESCE_STATS[VIEW_NAME]['coalesced_remote'], 1)
+
+    @override_settings(COALESCE_WAIT_TIMEOUT=0.1)
+    def test_timeout_falls_back_to_view(self):
+        """Не дождавшись ведущего, запрос выполняется сам"""
+        self.release.set()
+        middleware = RequestCoalescingMiddleware(self.view)
+        key = middleware._key(self.request())
+        cache.set(LOCK_KEY.format(key), 'token')
+        response = middleware(self.request())
+        self.assertEqual(response.content, 'ответ 1'.encode())
+        self.assertEqual(COALESCE_STATS[VIEW_NAME]['timeouts'], 1)
+
+    def test_conditional_requests_are_not_mixed(self):
+        """Условный запрос не склеивается с обычным"""
+        middleware = RequestCoalescingMiddleware(self.view)
+        self.assertNotEqual(
+            middleware._key(self.request()),
+            middleware._key(self.request(HTTP_IF_NONE_MATCH='"etag"')),
+        )
+
+
+class PersonalResponseTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_login_through_coalesced_page(self):
+        """Страница входа с CSRF-формой не делится между гостями,
+        и вход через нее проходит проверку CSRF"""
+        get_user_model().objects.create_user('reader', password='secret')
+        url = reverse('users:login')
+        snapshot = RequestCoalescingMiddleware._snapshot
+        shared = []
+
+        def spy(request, response):
+            result = snapshot(request, response)
+            shared.append(result)
+            return result
+
+        client = Client(enforce_csrf_checks=True)
+        with patch.object(RequestCoalescingMiddleware, '_snapshot',
+                          staticmethod(spy)):
+            client.get(url)
+        self.assertEqual(shared, [None])
+        response = client.post(url, {
+            'username': 'reader',
+            'password': 'secret',
+            'csrfmiddlewaretoken': client.cookies['csrftoken'].value,
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_guest_pages_are_shared(self):
+        """Общие страницы гостей через полный стек middleware
+        сохраняются для склейки"""
+        user = get_user_model().objects.create_user('author')
+        post = Post.objects.create(text='Пост', author=user)
+        snapshot = RequestCoalescingMiddleware._snapshot
+        shared = []
+
+        def spy(request, response):
+            result = snapshot(request, response)
+            shared.append(result)
+            return result
+
+        urls = (reverse('posts:index'),
+                reverse('posts:post_detail', args=(post.pk,)),
+                reverse('posts:profile', args=(user.username,)))
+        with patch.object(RequestCoalescingMiddleware, '_snapshot',
+                          staticmethod(spy)):
+            for url in urls:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(shared), len(urls))
+        for url, result in zip(urls, shared):
+            with self.subTest(url=url):
+                self.assertIsNotNone(result)
+
+    def test_stats_are_keyed_by_route(self):
+        """Счетчики ведутся по именам маршрутов, а не по путям"""
+        COALESCE_STATS.clear()
+        for post_id in range(3):
+            self.client.get(f'/posts/{post_id}/')
+        self.assertEqual(list(COALESCE_STATS), [VIEW_NAME])
@@ -1,11 +1,81 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.http import Http404, JsonResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-from .models import Comment, Follow, Group, Post
+from . import bulk
+from .models import Comment, Follow, Group, Post, PostTerm
+from .paginators import WindowedPaginator, pk_range_estimate
+from .search import tokenize
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список объектов без второго COUNT(*) и с оценкой числа строк
+    по диапазону ключей для больших таблиц без фильтров."""
+    show_full_result_count = False
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        estimate = None
+        if not queryset.query.where:
+            def estimate():
+                return pk_range_estimate(queryset.model.objects.all())
+        return WindowedPaginator(
+            queryset,
+            per_page,
+            estimate=estimate,
+            orphans=orphans,
+            allow_empty_first_page=allow_empty_first_page,
+        )
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('bulk/<str:task>/',
+                 self.admin_site.admin_view(self.bulk_progress),
+                 name='%s_%s_bulk' % info),
+        ] + super().get_urls()
+
+    def bulk_progress(self, request, task):
+        state = bulk.progress(task)
+        if state is None:
+            raise Http404
+        return JsonResponse(state)
+
+    def run_bulk(self, request, message, action, queryset, *args):
+        """Запускает массовое действие и сообщает о результате или,
+        для большой выборки, о фоновой задаче и адресе ее хода."""
+        count, task = bulk.start(action, queryset, *args)
+        if task is None:
+            self.message_user(request, f'{message}: {count}')
+            return
+        info = self.model._meta.app_label, self.model._meta.model_name
+        self.message_user(request, format_html(
+            '{}: {} - выполняется в фоне, <a href="{}">ход операции</a>',
+            message, count,
+            reverse('admin:%s_%s_bulk' % info, args=(task,)),
+        ))
+
+    def get_actions(self, request):
+        # Стандартное удаление загружает все объекты в память
+        actions = super().get_actions(request)
+        if any(name.startswith('bulk_delete') for name in actions):
+            actions.pop('delete_selected', None)
+        return actions
+
+
+class PostActionForm(ActionForm):
+    target_group = forms.ModelChoiceField(
+        Group.objects.all(), label='Группа', required=False)
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -14,36 +84,111 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    action_form = PostActionForm
+    actions = ('bulk_move', 'bulk_ungroup', 'bulk_delete')
     empty_value_display = '-пусто-'
     # Без нее тесты не проходят
     settings.EMPTY_VALUE_DISPLAY
     # На замену строчки 20, т.к. константа вынесена в settings
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по обратному индексу вместо LIKE по тексту: пост должен
+        # содержать все слова запроса
+        if not search_term.strip():
+            return queryset, False
+        terms = set(tokenize(search_term))
+        if not terms:
+            return queryset.none(), False
+        matched = PostTerm.objects.filter(term__in=terms).values(
+            'post_id').annotate(found=Count('term', distinct=True)).filter(
+            found=len(terms))
+        return queryset.filter(pk__in=matched.values('post_id')), False
+
+    def get_changelist_formset(self, request, **kwargs):
+        formset = super().get_changelist_formset(request, **kwargs)
+        # Группы для редактирования в списке читаются один раз
+        # на страницу, а не в каждой строке; iter() - чтобы list()
+        # не считал их отдельным COUNT(*)
+        field = formset.form.base_fields['group']
+        field.widget = forms.Select()
+        field.choices = list(iter(field.choices))
+        return formset
+
+    def bulk_move(self, request, queryset):
+        field = PostActionForm.base_fields['target_group']
+        try:
+            group = field.clean(request.POST.get('target_group'))
+        except ValidationError:
+            self.message_user(
+                request, 'Группа не найдена', level=messages.ERROR)
+            return
+        # Пустой выбор не должен молча убирать посты из групп,
+        # для этого есть отдельное действие
+        if group is None:
+            self.message_user(
+                request, 'Выберите группу', level=messages.ERROR)
+            return
+        self.run_bulk(request, 'Перенесено постов', bulk.move_posts,
+                      queryset, group)
+    bulk_move.short_description = 'Перенести в выбранную группу'
+
+    def bulk_ungroup(self, request, queryset):
+        self.run_bulk(request, 'Убрано из групп постов', bulk.move_posts,
+                      queryset, None)
+    bulk_ungroup.short_description = 'Убрать выбранные посты из групп'
+
+    def bulk_delete(self, request, queryset):
+        self.run_bulk(request, 'Удалено постов', bulk.delete_posts, queryset)
+    bulk_delete.short_description = 'Удалить выбранные посты'
+
 
 @admin.register(Group)
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(ScalableAdmin):
     list_display = ('title', 'slug', 'description')
     search_fields = ('title',)
     settings.EMPTY_VALUE_DISPLAY
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
         'created',
         'author'
     )
-    search_fields = ('text', 'author',)
+    list_select_related = ('author',)
+    autocomplete_fields = ('post', 'author')
+    search_fields = ('=author__username', 'text',)
     list_filter = ('created',)
+    actions = ('bulk_delete', 'bulk_delete_by_authors')
     settings.EMPTY_VALUE_DISPLAY
 
+    def bulk_delete(self, request, queryset):
+        self.run_bulk(request, 'Удалено комментариев', bulk.delete_comments,
+                      queryset)
+    bulk_delete.short_description = 'Удалить выбранные комментарии'
+
+    def bulk_delete_by_authors(self, request, queryset):
+        # Авторы читаются заранее: выбранные комментарии удаляются
+        # по ходу операции
+        authors = list(queryset.order_by().values_list(
+            'author_id', flat=True).distinct())
+        self.run_bulk(
+            request, 'Удалено комментариев', bulk.delete_comments,
+            Comment.objects.filter(author_id__in=authors))
+    bulk_delete_by_authors.short_description = (
+        'Удалить все комментарии авторов выбранных')
+
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScalableAdmin):
     list_display = ('pk', 'user', 'author',)
-    search_fields = ('author',)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=author__username', '=user__username',)
     settings.EMPTY_VALUE_DISPLAY
@@ -0,0 +1,249 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+
+from .models import Group, User
+from .versions import bump, cache_version
+
+logger = logging.getLogger(__name__)
+
+SCOPE = 'autocomplete'
+
+_index = None
+_lock = threading.Lock()
+_rebuilding = False
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class PrefixIndex:
+    """Отсортированный массив ключей (строка, запись) с поиском
+    префикса двоичным поиском.
+
+    У записи может быть несколько ключей (у группы - slug и название),
+    ранг записи хранится отдельно и учитывается при выборе лучших.
+    Под короткий префикс попадает большая часть ключей, поэтому лучшие
+    ``top`` записей для префиксов до SHORT_PREFIX символов запоминаются.
+    """
+    SHORT_PREFIX = 2
+
+    def __init__(self, version=None, top=10):
+        self.version = version
+        self.built = time.monotonic()
+        self._keys = []
+        self._items = {}
+        self._top = {}
+        self._top_size = top
+
+    def __len__(self):
+        return len(self._items)
+
+    def extend(self, entries):
+        """Добавляет новые записи и сортирует ключи один раз,
+        а не вставкой каждого."""
+        for item_id, keys, data, rank in entries:
+            keys = {key.lower() for key in keys if key}
+            self._items[item_id] = (keys, data, rank)
+            self._keys.extend((key, item_id) for key in keys)
+        self._keys.sort()
+        self._top.clear()
+
+    def add(self, item_id, keys, data, rank=0):
+        self.remove(item_id)
+        keys = {key.lower() for key in keys if key}
+        self._items[item_id] = (keys, data, rank)
+        for key in keys:
+            bisect.insort(self._keys, (key, item_id))
+        # Новая запись может только вытеснить худшую из запомненных
+        for prefix in self._short_prefixes(keys):
+            best = self._top.get(prefix)
+            if best is not None:
+                best.append(item_id)
+                best.sort(key=self._order, reverse=True)
+                del best[self._top_size:]
+
+    def remove(self, item_id):
+        item = self._items.pop(item_id, None)
+        if item is None:
+            return
+        for key in item[0]:
+            position = bisect.bisect_left(self._keys, (key, item_id))
+            del self._keys[position]
+        # Место удаленной записи занимает неизвестная следующая,
+        # такие списки пересчитываются при следующем поиске
+        for prefix in self._short_prefixes(item[0]):
+            if item_id in self._top.get(prefix, ()):
+                del self._top[prefix]
+
+    def rank(self, item_id):
+        item = self._items.get(item_id)
+        return 0 if item is None else item[2]
+
+    def _order(self, item_id):
+        return self._items[item_id][2], item_id
+
+    def _short_prefixes(self, keys):
+        return {key[:length] for key in keys
+                for length in range(1, self.SHORT_PREFIX + 1)}
+
+    def _scan(self, prefix):
+        found = set()
+        position = bisect.bisect_left(self._keys, (prefix,))
+        for key, item_id in self._keys[position:]:
+            if not key.startswith(prefix):
+                break
+            found.add(item_id)
+        return found
+
+    def search(self, prefix, limit):
+        """До ``limit`` записей с ключом на ``prefix`` по убыванию ранга."""
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        if len(prefix) <= self.SHORT_PREFIX and limit <= self._top_size:
+            best = self._top.get(prefix)
+            if best is None:
+                best = self._top[prefix] = heapq.nlargest(
+                    self._top_size, self._scan(prefix), key=self._order)
+            best = best[:limit]
+        else:
+            best = heapq.nlargest(limit, self._scan(prefix), key=self._order)
+        return [self._items[item_id][1] for item_id in best]
+
+
+def user_entry(user, rank=0):
+    return (
+        ('user', user.pk),
+        (user.username,),
+        {
+            'type': 'user',
+            'label': user.username,
+            'url': reverse('posts:profile', args=(user.username,)),
+        },
+        rank,
+    )
+
+
+def group_entry(group):
+    return (
+        ('group', group.pk),
+        (group.slug, group.title),
+        {
+            'type': 'group',
+            'label': group.title,
+            'url': reverse('posts:group_list', args=(group.slug,)),
+        },
+        group.post_count,
+    )
+
+
+def build(version=None):
+    """Собирает индекс имен пользователей и групп двумя запросами."""
+    index = PrefixIndex(version, settings.AUTOCOMPLETE_LIMIT)
+    index.extend(_user_entries())
+    groups = Group.objects.only('slug', 'title', 'post_count')
+    index.extend(group_entry(group) for group in groups.iterator())
+    return index
+
+
+def _user_entries():
+    users = User.objects.filter(is_active=True).select_related(
+        'stats').only('username', 'stats__follower_count')
+    for user in users.iterator():
+        stats = getattr(user, 'stats', None)
+        yield user_entry(user, stats.follower_count if stats else 0)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='autocomplete')
+    return _executor
+
+
+def _rebuild(version):
+    global _index, _rebuilding
+    try:
+        index = build(version)
+        with _lock:
+            _index = index
+    except Exception:
+        logger.exception('Индекс подсказок не пересобран')
+    finally:
+        with _lock:
+            _rebuilding = False
+        connection.close()
+
+
+def get_index():
+    """Индекс процесса; пересобирается, если другой процесс изменил
+    имена, и раз в AUTOCOMPLETE_REFRESH секунд ради свежих рангов.
+
+    Синхронно индекс собирается только первый раз, дальше пересборка
+    идет в фоне, а запросы до ее окончания отвечает прежний индекс.
+    Изменения этого процесса, сделанные во время пересборки, сдвигают
+    версию, и следующий запрос запускает пересборку снова.
+    """
+    global _index, _rebuilding
+    version = cache_version(SCOPE)
+    with _lock:
+        if _index is None:
+            _index = build(version)
+        elif (not _rebuilding and (
+                _index.version != version
+                or time.monotonic() - _index.built
+                > settings.AUTOCOMPLETE_REFRESH)):
+            _rebuilding = True
+            executor().submit(_rebuild, version)
+        return _index
+
+
+def suggest(prefix, limit=None):
+    index = get_index()
+    with _lock:
+        return index.search(prefix, limit or settings.AUTOCOMPLETE_LIMIT)
+
+
+def _apply(change):
+    bump(SCOPE)
+    version = cache_version(SCOPE)
+    with _lock:
+        if _index is not None:
+            change(_index)
+            _index.version = version
+
+
+def _update(change):
+    # Индекс процесса меняется на месте после фиксации транзакции,
+    # остальные процессы узнают об изменении по версии области
+    # и пересобирают свои индексы
+    transaction.on_commit(lambda: _apply(change))
+
+
+def user_changed(user):
+    if not user.is_active:
+        user_deleted(user)
+        return
+    _update(lambda index: index.add(
+        *user_entry(user, index.rank(('user', user.pk)))))
+
+
+def user_deleted(user):
+    _update(lambda index: index.remove(('user', user.pk)))
+
+
+def group_changed(group):
+    _update(lambda index: index.add(*group_entry(group)))
+
+
+def group_deleted(group):
+    _update(lambda index: index.remove(('group', group.pk)))
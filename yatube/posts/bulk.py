@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from . import counters, feeds, thumbnails
+from .models import Comment, Group, Post, PostTerm, TimelineEntry, UserStats
+from .paginators import forget_counts
+from .versions import bump
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_KEY = 'bulk:{}'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def chunks(queryset, size=None):
+    """Первичные ключи выборки пачками по возрастанию: каждая пачка
+    читается по индексу после последнего ключа предыдущей."""
+    size = size or settings.BULK_CHUNK_SIZE
+    last = None
+    while True:
+        page = queryset.order_by('pk')
+        if last is not None:
+            page = page.filter(pk__gt=last)
+        pks = list(page.values_list('pk', flat=True)[:size])
+        if not pks:
+            return
+        yield pks
+        last = pks[-1]
+
+
+def _deleted(queryset):
+    # Удаление одним DELETE без загрузки объектов и сигналов: счетчики,
+    # версии кэша и файлы поддерживаются вызывающим кодом
+    return queryset._raw_delete(queryset.db)
+
+
+def move_posts(queryset, group, report=None):
+    """Переносит посты выборки в группу ``group`` (или убирает из групп)."""
+    group_id = group.pk if group is not None else None
+    done = 0
+    for pks in chunks(queryset):
+        with transaction.atomic():
+            rows = list(Post.objects.filter(pk__in=pks).exclude(
+                group_id=group_id).values_list('pk', 'author_id', 'group_id'))
+            moved = Post.objects.filter(
+                pk__in=[pk for pk, _, _ in rows]).update(group_id=group_id)
+            deltas = Counter()
+            for _, _, old in rows:
+                deltas[old] -= 1
+            deltas[group_id] += moved
+            counters.adjust(Group.objects, 'post_count', deltas)
+        groups = [f'group:{pk}' for pk in deltas if pk is not None]
+        forget_counts(*groups)
+        bump('feed', *groups,
+             *(f'author:{author}' for _, author, _ in rows),
+             *(f'post:{pk}' for pk, _, _ in rows))
+        done += len(pks)
+        if report is not None:
+            report(done)
+    return done
+
+
+def delete_posts(queryset, report=None):
+    """Удаляет посты выборки вместе с комментариями, термами поиска
+    и записями лент."""
+    done = 0
+    for pks in chunks(queryset):
+        with transaction.atomic():
+            rows = list(Post.objects.filter(pk__in=pks).values_list(
+                'author_id', 'group_id', 'image'))
+            _deleted(Comment.objects.filter(post_id__in=pks))
+            _deleted(PostTerm.objects.filter(post_id__in=pks))
+            _deleted(TimelineEntry.objects.filter(post_id__in=pks))
+            _deleted(Post.objects.filter(pk__in=pks))
+            authors = Counter(author for author, _, _ in rows)
+            groups = Counter(group for _, group, _ in rows)
+            counters.adjust(
+                UserStats.objects, 'post_count',
+                {author: -count for author, count in authors.items()},
+                key='user_id')
+            counters.adjust(
+                Group.objects, 'post_count',
+                {group: -count for group, count in groups.items()})
+            for image in {image for _, _, image in rows}:
+                thumbnails.release(image)
+        for author in authors:
+            feeds.forget_recent_posts(author)
+        scopes = ['feed', *(f'author:{author}' for author in authors),
+                  *(f'group:{group}' for group in groups if group)]
+        forget_counts(*scopes)
+        bump(*scopes, *(f'post:{pk}' for pk in pks))
+        done += len(pks)
+        if report is not None:
+            report(done)
+    return done
+
+
+def delete_comments(queryset, report=None):
+    """Удаляет комментарии выборки."""
+    done = 0
+    for pks in chunks(queryset):
+        with transaction.atomic():
+            posts = Counter(Comment.objects.filter(
+                pk__in=pks).values_list('post_id', flat=True))
+            _deleted(Comment.objects.filter(pk__in=pks))
+            counters.adjust(
+                Post.objects, 'comment_count',
+                {post: -count for post, count in posts.items()})
+        bump(*(f'post:{post}' for post in posts))
+        done += len(pks)
+        if report is not None:
+            report(done)
+    return done
+
+
+def progress(task):
+    """Ход фоновой операции: action, total, done, finished, failed,
+    started, updated и stale - операция не завершена и не сообщала
+    о ходе дольше BULK_STALE_TIMEOUT секунд."""
+    state = cache.get(PROGRESS_KEY.format(task))
+    if state is not None:
+        state['stale'] = (not state['finished'] and time.time()
+                          - state['updated'] > settings.BULK_STALE_TIMEOUT)
+    return state
+
+
+def _save_progress(task, **state):
+    key = PROGRESS_KEY.format(task)
+    current = cache.get(key) or {}
+    current.update(state, updated=time.time())
+    cache.set(key, current, settings.BULK_PROGRESS_TIMEOUT)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='bulk')
+    return _executor
+
+
+def _run(task, action, queryset, args):
+    try:
+        action(queryset, *args, report=lambda done: _save_progress(
+            task, done=done))
+        _save_progress(task, finished=True)
+    except Exception:
+        logger.exception('Массовая операция %s не выполнена', task)
+        _save_progress(task, finished=True, failed=True)
+    finally:
+        connection.close()
+
+
+def start(action, queryset, *args):
+    """Выполняет ``action`` над выборкой сразу или, если в ней больше
+    BULK_BACKGROUND_THRESHOLD строк, в фоне после фиксации транзакции.
+
+    Фоновая операция выполняется в потоке процесса и теряется при его
+    перезапуске; обработанные пачки остаются зафиксированными, а ход
+    операции помечается как stale, и ее можно запустить повторно.
+
+    Возвращает (число строк, идентификатор фоновой задачи или None).
+    """
+    total = queryset.count()
+    if total <= settings.BULK_BACKGROUND_THRESHOLD:
+        return action(queryset, *args), None
+    task = uuid.uuid4().hex
+    _save_progress(task, action=action.__name__, total=total, done=0,
+                   finished=False, failed=False, started=time.time())
+    transaction.on_commit(
+        lambda: executor().submit(_run, task, action, queryset, args))
+    return total, task
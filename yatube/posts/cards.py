@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .thumbnails import attach_pictures
+from .versions import scope_versions
+
+CARD_KEY = 'card:{}:{}:{}:{}'
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def attach_cards(posts):
+    """Добавляет постам отрисованные карточки ``post.card``.
+
+    Версии и готовые карточки читаются двумя get_many, отрисовываются
+    только промахи, и они записываются обратно одним set_many. Картинки
+    всех карточек, кроме первой, загружаются лениво, поэтому карточка
+    кэшируется в двух вариантах.
+    """
+    posts = list(posts)
+    scopes = []
+    for post in posts:
+        scopes += [f'post:{post.pk}', f'user:{post.author_id}']
+    versions = iter(scope_versions(*scopes))
+    keys = [CARD_KEY.format(post.pk, next(versions), next(versions),
+                            int(index > 0))
+            for index, post in enumerate(posts)]
+    cards = cache.get_many(keys)
+    # Миниатюры карточек, которые придется отрисовать, ищутся пакетом
+    attach_pictures([post for post, key in zip(posts, keys)
+                     if key not in cards])
+    missing = {}
+    for index, (post, key) in enumerate(zip(posts, keys)):
+        if key not in cards:
+            missing[key] = render_to_string(
+                CARD_TEMPLATE, {'post': post, 'lazy': index > 0})
+            cards[key] = missing[key]
+        post.card = mark_safe(cards[key])
+    if missing:
+        cache.set_many(missing, settings.FRAGMENT_CACHE_TIMEOUT)
+    return posts
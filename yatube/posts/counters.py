@@ -0,0 +1,68 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _change(queryset, field, delta):
+    queryset.update(**{field: F(field) + delta})
+
+
+def user_stats(user_id):
+    return UserStats.objects.filter(user_id=user_id)
+
+
+def post_added(post, delta=1):
+    _change(user_stats(post.author_id), 'post_count', delta)
+    if post.group_id:
+        _change(Group.objects.filter(pk=post.group_id), 'post_count', delta)
+
+
+def post_moved(old_group_id, new_group_id):
+    if old_group_id:
+        _change(Group.objects.filter(pk=old_group_id), 'post_count', -1)
+    if new_group_id:
+        _change(Group.objects.filter(pk=new_group_id), 'post_count', 1)
+
+
+def comment_added(comment, delta=1):
+    _change(Post.objects.filter(pk=comment.post_id), 'comment_count', delta)
+
+
+def follow_added(follow, delta=1):
+    _change(user_stats(follow.author_id), 'follower_count', delta)
+    _change(user_stats(follow.user_id), 'following_count', delta)
+
+
+def adjust(queryset, field, deltas, key='pk'):
+    """Меняет счетчик ``field`` у строк по словарю {значение ``key``:
+    изменение} - по запросу на строку, а не на объект."""
+    for value, delta in deltas.items():
+        if value is not None and delta:
+            _change(queryset.filter(**{key: value}), field, delta)
+
+
+def _count(queryset, field, outer='pk'):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0)
+
+
+def recount():
+    """Пересчитывает все счетчики набором UPDATE-запросов."""
+    UserStats.objects.bulk_create(
+        (UserStats(user_id=pk) for pk in User.objects.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()),
+        ignore_conflicts=True,
+    )
+    Group.objects.update(post_count=_count(Post.objects, 'group'))
+    Post.objects.update(comment_count=_count(Comment.objects, 'post'))
+    UserStats.objects.update(
+        post_count=_count(Post.objects, 'author', 'user_id'),
+        follower_count=_count(Follow.objects, 'author', 'user_id'),
+        following_count=_count(Follow.objects, 'user', 'user_id'),
+    )
@@ -0,0 +1,198 @@
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginators import PREVIOUS, CursorPaginator
+
+logger = logging.getLogger(__name__)
+
+RECENT_POSTS_KEY = 'feeds:recent:{}'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_pull_author(author_id):
+    """Посты популярных авторов не раскладываются по лентам, а читаются
+    при открытии ленты.
+
+    Автор становится популярным, набрав FEED_PULL_THRESHOLD подписчиков,
+    и перестает, когда их меньше FEED_PUSH_THRESHOLD: колебания числа
+    подписчиков у порога не запускают догрузку лент раз за разом.
+    """
+    return UserStats.objects.filter(
+        user_id=author_id, pull_feed=True).exists()
+
+
+def followed_pull_authors(user):
+    return list(Follow.objects.filter(
+        user=user, author__stats__pull_feed=True,
+    ).values_list('author_id', flat=True))
+
+
+def recent_posts(author_id):
+    """Ключи (pub_date, pk) последних постов автора, от новых к старым."""
+    key = RECENT_POSTS_KEY.format(author_id)
+    recent = cache.get(key)
+    if recent is None:
+        recent = list(
+            Post.objects.filter(author_id=author_id)
+            .order_by('-pub_date', '-pk')
+            .values_list('pub_date', 'pk')[:settings.FEED_PULL_CACHE_SIZE]
+        )
+        cache.set(key, recent, settings.FEED_PULL_CACHE_TIMEOUT)
+    return recent
+
+
+def forget_recent_posts(author_id):
+    cache.delete(RECENT_POSTS_KEY.format(author_id))
+
+
+def author_keys(author_id, values, direction, limit):
+    """До ``limit`` ключей постов автора после курсора ``values``.
+
+    Читает закэшированный список последних постов и идет в базу, только
+    если курсор ушел глубже этого списка.
+    """
+    recent = recent_posts(author_id)
+    complete = len(recent) < settings.FEED_PULL_CACHE_SIZE
+    bound = tuple(values) if values is not None else None
+    if direction == PREVIOUS:
+        keys = [key for key in reversed(recent) if key > bound]
+        if complete or (recent and recent[-1] <= bound):
+            return keys[:limit]
+    else:
+        keys = [key for key in recent if bound is None or key < bound]
+        if complete or len(keys) >= limit:
+            return keys[:limit]
+    posts = CursorPaginator(Post.objects.filter(author_id=author_id), limit)
+    return [(post.pub_date, post.pk)
+            for post in posts.fetch(values, direction, limit)]
+
+
+def push_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    forget_recent_posts(post.author_id)
+    if is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fill_timeline(user_id, author_id):
+    """Добавляет в ленту пользователя все посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('pk', 'pub_date')
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts.iterator()),
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def prune_timeline(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def backfill_author(author_id):
+    """Догружает посты автора в ленты всех его подписчиков."""
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    for follower_id in followers.iterator():
+        fill_timeline(follower_id, author_id)
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='feeds')
+    return _executor
+
+
+def _run_backfill(author_id):
+    # Потерянную при перезапуске догрузку восстанавливает команда
+    # backfill_timeline
+    try:
+        backfill_author(author_id)
+    except Exception:
+        logger.exception('Ленты автора %s не догружены', author_id)
+    finally:
+        connection.close()
+
+
+def follow_added(user_id, author_id):
+    UserStats.objects.filter(
+        user_id=author_id,
+        pull_feed=False,
+        follower_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).update(pull_feed=True)
+    # Популярного автора не раскладываем: его посты читаются при открытии
+    # ленты, а уже разложенные записи схлопнутся при слиянии.
+    if not is_pull_author(author_id):
+        fill_timeline(user_id, author_id)
+
+
+def follow_removed(user_id, author_id):
+    prune_timeline(user_id, author_id)
+    switched = UserStats.objects.filter(
+        user_id=author_id,
+        pull_feed=True,
+        follower_count__lt=settings.FEED_PUSH_THRESHOLD,
+    ).update(pull_feed=False)
+    if not switched:
+        return
+    # Автор снова раскладывается по лентам: посты, которые раньше
+    # читались при открытии ленты, догружаются оставшимся подписчикам
+    # в фоне, а не в запросе отписки. Новые посты уже раскладываются,
+    # поэтому режим переключается до догрузки.
+    transaction.on_commit(
+        lambda: executor().submit(_run_backfill, author_id))
+
+
+class TimelinePaginator(CursorPaginator):
+    """Курсорная пагинация ленты подписок.
+
+    Разложенные записи читаются одним диапазоном по индексу
+    (user, pub_date, post), посты популярных авторов - из их списков
+    последних постов; источники сливаются через heapq.merge, после чего
+    посты подгружаются по первичному ключу.
+    """
+    ordering = ('-pub_date', '-post_id')
+
+    def __init__(self, object_list, per_page, pull_authors=(), **kwargs):
+        self.pull_authors = pull_authors
+        super().__init__(object_list, per_page, **kwargs)
+
+    def key(self, obj):
+        return [obj.pub_date, obj.pk]
+
+    def fetch(self, values, direction, limit):
+        entries = super().fetch(values, direction, limit)
+        sources = [[(entry.pub_date, entry.post_id) for entry in entries]]
+        sources.extend(author_keys(author_id, values, direction, limit)
+                       for author_id in self.pull_authors)
+        keys = []
+        for _, pk in heapq.merge(*sources, reverse=direction != PREVIOUS):
+            if pk not in keys:
+                keys.append(pk)
+                if len(keys) == limit:
+                    break
+        posts = Post.objects.select_related('author', 'group').in_bulk(keys)
+        return [posts[pk] for pk in keys if pk in posts]
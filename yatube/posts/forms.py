@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
-from .models import Comment, Post
+from .images import normalize_image
+from .models import Comment, Group, Post, User
 
 
 class PostForm(forms.ModelForm):
@@ -12,6 +14,13 @@ class PostForm(forms.ModelForm):
             'group': 'выберите группу, к которой будет относиться пост'
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Уже сохраненная картинка при правке поста не перекодируется
+        if isinstance(image, UploadedFile):
+            image = normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -23,3 +32,13 @@ class CommentForm(forms.ModelForm):
         help_texts = {
             'text': 'Текст нового комментария',
         }
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(label='Запрос', max_length=200)
+    group = forms.ModelChoiceField(
+        Group.objects.all(), label='Группа', required=False,
+        to_field_name='slug')
+    author = forms.ModelChoiceField(
+        User.objects.all(), label='Автор', required=False,
+        to_field_name='username', widget=forms.TextInput)
@@ -0,0 +1,67 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def _flatten(image):
+    """Переводит картинку в RGB, подкладывая под прозрачность белый фон."""
+    if image.mode == 'P' and 'transparency' in image.info:
+        image = image.convert('RGBA')
+    if image.mode in ('RGBA', 'LA'):
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def normalize_image(upload):
+    """Приводит загруженную картинку к виду для хранения.
+
+    Размеры проверяются по заголовку до декодирования, JPEG декодируется
+    сразу в уменьшенном масштабе (draft). Затем применяется ориентация
+    из EXIF, картинка вписывается в IMAGE_MAX_SIZE и перекодируется
+    в IMAGE_FORMAT без метаданных. Результат пишется во временный файл,
+    который уходит на диск, если больше FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('Картинка слишком большая.', code='too_large')
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError('Картинка слишком большая.', code='too_large')
+    # Поврежденный файл проходит проверку поля, но не декодируется:
+    # обрезанный JPEG, битый EXIF или испорченный PNG
+    try:
+        output = _encode(image)
+    except (OSError, SyntaxError, ValueError):
+        raise ValidationError(
+            'Не удалось прочитать картинку.', code='invalid_image')
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return File(output, name=name + EXTENSIONS[settings.IMAGE_FORMAT])
+
+
+def _encode(image):
+    limit = settings.IMAGE_MAX_SIZE
+    image.draft('RGB', (limit, limit))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    image = _flatten(image)
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(
+        output,
+        settings.IMAGE_FORMAT,
+        quality=settings.IMAGE_QUALITY,
+        progressive=True,
+        optimize=True,
+    )
+    output.seek(0)
+    return output
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = ('Генерирует миниатюры и сохраняет размеры картинок '
+            'и разметку миниатюр в существующих постах')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Обработать и посты с уже сохраненными миниатюрами',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails='')
+        names = posts.values_list('image', flat=True).distinct()
+        total = 0
+        # Один файл может принадлежать многим постам: generate()
+        # обновляет их все
+        for name in list(names):
+            generate(name)
+            total += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано картинок: {total}'))
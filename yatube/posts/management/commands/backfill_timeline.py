@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from posts.feeds import fill_timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Заполняет материализованные ленты по существующим подпискам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить существующие записи лент перед заполнением',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            TimelineEntry.objects.all().delete()
+        # Посты популярных авторов читаются при открытии ленты
+        follows = Follow.objects.exclude(
+            author__stats__pull_feed=True,
+        ).values_list('user_id', 'author_id')
+        total = 0
+        for user_id, author_id in follows.iterator():
+            fill_timeline(user_id, author_id)
+            total += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано подписок: {total}'))
@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.storage import content_hash
+from posts.thumbnails import backend
+from posts.versions import bump, post_scopes
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище по хэшу содержимого, '
+            'удаляя дубликаты')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = (Post.objects.exclude(image='')
+                 .values_list('image', flat=True).distinct())
+        moved = removed = 0
+        for name in names.iterator():
+            if not storage.exists(name):
+                continue
+            with storage.open(name) as content:
+                target = storage.hashed_name(name, content_hash(content))
+            if target == name:
+                continue
+            duplicate = storage.exists(target)
+            if not duplicate:
+                path = storage.path(target)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(storage.path(name), path)
+            self.repoint(name, target)
+            if duplicate:
+                # Такое содержимое уже лежит на диске: файл - дубликат
+                backend.delete(name)
+                removed += 1
+            else:
+                backend.delete(name, delete_file=False)
+                moved += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, удалено дубликатов: {removed}'))
+
+    @staticmethod
+    def repoint(name, target):
+        posts = Post.objects.filter(image=name)
+        scopes = {scope for post in posts.only('author_id', 'group_id')
+                  for scope in post_scopes(post)}
+        # update() не вызывает сигналы и не трогает общий файл, поэтому
+        # закэшированные карточки и страницы сбрасываются здесь
+        posts.update(image=target, thumbnails='')
+        bump(*scopes)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, PostTerm
+from posts.search import index_post
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает обратный индекс полнотекстового поиска по постам'
+
+    def handle(self, *args, **options):
+        PostTerm.objects.all().delete()
+        total = 0
+        for post in Post.objects.only('pk', 'text').iterator():
+            index_post(post)
+            total += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Проиндексировано постов: {total}'))
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_postterm'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='postterm',
+            options={'verbose_name': 'Терм поиска', 'verbose_name_plural': 'Термы поиска'},
+        ),
+        migrations.AlterField(
+            model_name='postterm',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='posts.Post', verbose_name='Пост'),
+        ),
+    ]
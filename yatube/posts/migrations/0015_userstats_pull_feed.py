@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_pull_authors(apps, schema_editor):
+    UserStats = apps.get_model('posts', 'UserStats')
+    UserStats.objects.filter(
+        follower_count__gte=settings.FEED_PULL_THRESHOLD,
+    ).update(pull_feed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_postterm_verbose_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='pull_feed',
+            field=models.BooleanField(default=False, verbose_name='Посты читаются при открытии ленты'),
+        ),
+        migrations.RunPython(mark_pull_authors, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
 
+from .storage import post_image_storage
+
 User = get_user_model()
 
 
@@ -32,13 +34,53 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        storage=post_image_storage,
+    )
+    # Заполняются при загрузке и генерации миниатюр, чтобы страницы
+    # строили разметку картинок без обращений к файлам и sorl
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки',
+        null=True,
+        editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки',
+        null=True,
+        editable=False,
+    )
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        default='',
+        editable=False,
+    )
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
     )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = (
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_date_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_date_idx',
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_date_idx',
+            ),
+            # Подсчет ссылок на файл картинки перед его удалением
+            models.Index(fields=['image'], name='post_image_idx'),
+        )
 
     def __str__(self) -> str:
         return self.text[:settings.POST_LIMIT]
@@ -48,6 +90,11 @@ class Group(models.Model):
     title = models.CharField('Заголовок', max_length=200)
     slug = models.SlugField('Группа', unique=True)
     description = models.TextField('Описание')
+    post_count = models.PositiveIntegerField(
+        'Постов',
+        default=0,
+        editable=False,
+    )
 
     def __str__(self) -> str:
         return self.title
@@ -80,6 +127,12 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.author}: {self.text[:settings.POST_LIMIT]}'
@@ -102,16 +155,107 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        indexes = (
+            models.Index(fields=['user'], name='follow_user_idx'),
+        )
         constraints = (
             models.UniqueConstraint(
                 fields=['author', 'user'],
                 name='unique_follow',
             ),
             models.CheckConstraint(
-                check=models.Q(user=models.F('author')),
+                check=~models.Q(user=models.F('author')),
                 name='user_cannot_follow_himself'
             )
         )
 
     def __str__(self) -> str:
         return f'{self.user} подписан на {self.author}'
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: запись на каждый пост автора,
+    на которого подписан пользователь."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_date_idx',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.post_id}'
+
+
+class PostTerm(models.Model):
+    """Обратный индекс полнотекстового поиска: основа слова и сколько
+    раз она встречается в тексте поста."""
+    TERM_LENGTH = 64
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='terms',
+        verbose_name='Пост',
+    )
+    term = models.CharField('Основа слова', max_length=TERM_LENGTH)
+    weight = models.PositiveIntegerField('Вхождений')
+
+    class Meta:
+        verbose_name = 'Терм поиска'
+        verbose_name_plural = 'Термы поиска'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'),
+                name='unique_post_term',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.term} в посте {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Поддерживаемые сигналами счетчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    post_count = models.PositiveIntegerField('Постов', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    # Режим ленты хранится явно и меняется с гистерезисом, см. posts.feeds
+    pull_feed = models.BooleanField(
+        'Посты читаются при открытии ленты', default=False)
+
+    class Meta:
+        verbose_name = 'Счетчики пользователя'
+        verbose_name_plural = 'Счетчики пользователей'
+
+    def __str__(self) -> str:
+        return f'{self.user}: {self.post_count}'
@@ -0,0 +1,77 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .versions import cache_version, last_modified
+
+PAGE_KEY = 'page:{}'
+
+
+def _validators(request, scopes):
+    version = cache_version(*scopes)
+    path = request.get_full_path()
+    etag = '"{}"'.format(
+        hashlib.md5(f'{path}:{version}'.encode()).hexdigest())
+    modified = last_modified(*scopes)
+    # HTTP-даты хранят целые секунды
+    return version, etag, modified and int(modified)
+
+
+def _annotate(response, etag, modified):
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
+
+
+def cache_anonymous_page(get_scopes):
+    """Кэш целых страниц для гостей.
+
+    ``get_scopes(**kwargs)`` по аргументам представления возвращает
+    области версий, от которых зависит страница, или None - тогда
+    представление вызывается как обычно (например, чтобы отдать 404).
+    ETag собирается из пути и версий областей, Last-Modified - из времени
+    их последнего сдвига, поэтому условный запрос получает 304 без
+    обращения к шаблонам. Авторизованным пользователям страницы
+    не кэшируются: в них есть форма с CSRF-токеном и личная шапка.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(**kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            version, etag, modified = _validators(request, scopes)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=modified)
+            if response is not None:
+                return response
+            key = PAGE_KEY.format(
+                hashlib.md5(request.get_full_path().encode()).hexdigest())
+            entry = cache.get(key)
+            if entry is not None and entry['version'] == version:
+                response = HttpResponse(
+                    entry['content'], content_type=entry['content_type'])
+                return _annotate(response, etag, modified)
+            response = view(request, *args, **kwargs)
+            # Страницу с выданным CSRF-токеном или cookie делить нельзя
+            if (response.status_code == 200 and not response.streaming
+                    and not response.cookies
+                    and not request.META.get('CSRF_COOKIE_USED')):
+                cache.set(key, {
+                    'version': version,
+                    'content': response.content,
+                    'content_type': response['Content-Type'],
+                }, settings.PAGE_CACHE_TIMEOUT)
+                _annotate(response, etag, modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,253 @@
+import base64
+import binascii
+import datetime as dt
+import json
+from collections.abc import Sequence
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Max, Min, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import SimpleLazyObject, cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+COUNT_KEY = 'paginator:count:{}'
+
+
+def _dump_value(value):
+    if isinstance(value, dt.datetime):
+        return value.isoformat()
+    return value
+
+
+def _load_value(value, kind):
+    """Значение ключа нужного типа или None для подделанного токена."""
+    if kind is dt.datetime:
+        return parse_datetime(value) if isinstance(value, str) else None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if kind is int:
+        return value if isinstance(value, int) else None
+    return kind(value)
+
+
+def encode_cursor(direction, values):
+    """Непрозрачный токен курсора: направление и ключ граничной записи."""
+    raw = json.dumps([direction] + [_dump_value(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, kinds=(dt.datetime, int)):
+    """Разбирает токен с ключом типов ``kinds``; для битого или
+    подделанного токена возвращает (None, None)."""
+    if not token:
+        return None, None
+    try:
+        # Курсор страницы может быть ленивым объектом
+        token = str(token)
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if (not isinstance(data, list) or len(data) != len(kinds) + 1
+                or data[0] not in (NEXT, PREVIOUS)):
+            return None, None
+        values = [_load_value(value, kind)
+                  for value, kind in zip(data[1:], kinds)]
+    except (ValueError, TypeError, binascii.Error):
+        return None, None
+    if any(value is None for value in values):
+        return None, None
+    return data[0], values
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре полей вместо LIMIT/OFFSET.
+
+    Страница выбирается условием «строго после граничной записи» по
+    индексу, поэтому глубокие страницы стоят столько же, сколько первая,
+    а COUNT(*) не выполняется, пока к ``count`` никто не обратился.
+    """
+    ordering = ('-pub_date', '-pk')
+    # Типы значений ключа в токене курсора
+    kinds = (dt.datetime, int)
+    # Курсор, за которым записей не осталось, открывает первую страницу
+    restart_exhausted = True
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=None, **kwargs):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+        super().__init__(object_list, per_page, **kwargs)
+
+    def _check_object_list_is_ordered(self):
+        # Порядок задается самим пагинатором в fetch()
+        pass
+
+    @property
+    def keys(self):
+        return [field.lstrip('-') for field in self.ordering]
+
+    @property
+    def descending(self):
+        return self.ordering[0].startswith('-')
+
+    def key(self, obj):
+        return [getattr(obj, key) for key in self.keys]
+
+    def _keyset_filter(self, values, lookup):
+        first, second = self.keys
+        return (Q(**{f'{first}__{lookup}': values[0]})
+                | Q(**{first: values[0], f'{second}__{lookup}': values[1]}))
+
+    def fetch(self, values, direction, limit):
+        """Выбирает до ``limit`` записей после ключа ``values``.
+
+        Для направления PREVIOUS записи возвращаются в обратном порядке.
+        """
+        ordering = self.ordering
+        forward = direction != PREVIOUS
+        if not forward:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}'
+                        for field in ordering]
+        queryset = self.object_list.order_by(*ordering)
+        if values is not None:
+            lookup = 'lt' if self.descending == forward else 'gt'
+            queryset = queryset.filter(self._keyset_filter(values, lookup))
+        return list(queryset[:limit])
+
+    def get_page(self, cursor):
+        """Страница после курсора. Записи и курсоры ссылок читаются при
+        первом обращении, а не в представлении: ключ кэша фрагмента
+        строится по запрошенному курсору ``token``, и попадание в кэш
+        обходится без запроса к базе."""
+        rows = LazyRows(self, cursor)
+        page = self._get_page(rows, 1, self)
+        page.token = cursor or ''
+        page.cursor = SimpleLazyObject(lambda: rows.cursor)
+        page.next_cursor = SimpleLazyObject(lambda: rows.next_cursor)
+        page.previous_cursor = SimpleLazyObject(
+            lambda: rows.previous_cursor)
+        return page
+
+    def fetch_page(self, cursor):
+        """Записи страницы после курсора и курсоры ее ссылок:
+        (записи, курсор, следующий, предыдущий)."""
+        direction, values = decode_cursor(cursor, self.kinds)
+        try:
+            rows = self.fetch(values, direction, self.per_page + 1)
+        except (ValueError, TypeError, ValidationError):
+            rows = []
+        if values is not None and not rows and self.restart_exhausted:
+            direction, values, cursor = None, None, None
+            rows = self.fetch(None, NEXT, self.per_page + 1)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = values is not None, has_more
+        return (
+            rows,
+            cursor or '',
+            encode_cursor(NEXT, self.key(rows[-1]))
+            if has_next and rows else '',
+            encode_cursor(PREVIOUS, self.key(rows[0]))
+            if has_previous and rows else '',
+        )
+
+
+class LazyRows(Sequence):
+    """Записи курсорной страницы, читаемые при первом обращении."""
+    def __init__(self, paginator, cursor):
+        self.paginator = paginator
+        self.token = cursor
+
+    @cached_property
+    def _fetched(self):
+        return self.paginator.fetch_page(self.token)
+
+    def __len__(self):
+        return len(self._fetched[0])
+
+    def __getitem__(self, index):
+        return self._fetched[0][index]
+
+    @property
+    def cursor(self):
+        return self._fetched[1]
+
+    @property
+    def next_cursor(self):
+        return self._fetched[2]
+
+    @property
+    def previous_cursor(self):
+        return self._fetched[3]
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста в порядке написания по индексу
+    (post, created, id)."""
+    ordering = ('created', 'pk')
+    # Порции догружаются к уже показанным: после удаления последних
+    # комментариев курсор дает пустую порцию, а не повтор первой
+    restart_exhausted = False
+
+
+def pk_range_estimate(queryset):
+    """Оценка числа строк по диапазону первичных ключей: два чтения
+    индекса вместо COUNT(*)."""
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['high'] is None:
+        return 0
+    return bounds['high'] - bounds['low'] + 1
+
+
+def forget_counts(*scopes):
+    cache.delete_many([COUNT_KEY.format(scope) for scope in scopes])
+
+
+class WindowedPaginator(Paginator):
+    """Постраничная навигация с окном ссылок вокруг текущей страницы.
+
+    Число записей кэшируется по области выборки (``scope``) до создания
+    или удаления поста в ней. Если оценка ``estimate`` не меньше
+    PAGINATOR_EXACT_COUNT_LIMIT, точный COUNT(*) не выполняется.
+    """
+    def __init__(self, object_list, per_page, scope=None, estimate=None,
+                 window=None, **kwargs):
+        self.scope = scope
+        self.estimate = estimate
+        self.window = window or settings.PAGINATOR_WINDOW
+        super().__init__(object_list, per_page, **kwargs)
+
+    def _count(self):
+        if self.estimate is not None:
+            estimate = self.estimate()
+            if estimate >= settings.PAGINATOR_EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+    @cached_property
+    def count(self):
+        if self.scope is None:
+            return self._count()
+        key = COUNT_KEY.format(self.scope)
+        count = cache.get(key)
+        if count is None:
+            count = self._count()
+            cache.set(key, count, settings.PAGINATOR_COUNT_TIMEOUT)
+        return count
+
+    def page_window(self, number):
+        first = max(1, number - self.window)
+        last = min(self.num_pages, number + self.window)
+        return range(first, last + 1)
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        page.window = self.page_window(page.number)
+        return page
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.crypto import constant_time_compare, salted_hmac
+from PIL import Image, ImageOps
+
+from .images import EXTENSIONS
+from .models import Post
+from .thumbnails import MIME_TYPES
+
+GEOMETRY = re.compile(r'^(\d{1,4})x(\d{1,4})$')
+SALT = 'posts.resize'
+
+
+class ResizeBusy(Exception):
+    """Очередь пула переполнена или он не успел с ответом."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+
+
+def sign(geometry, path):
+    return salted_hmac(SALT, f'{geometry}/{path}').hexdigest()[:32]
+
+
+def resize_url(path, geometry):
+    """Подписанная ссылка на картинку ``path``, вписанную в ``geometry``."""
+    return reverse('posts:resize_image', kwargs={
+        'signature': sign(geometry, path),
+        'geometry': geometry,
+        'path': path,
+    })
+
+
+def parse_geometry(signature, geometry, path):
+    """Проверяет подпись и размеры; возвращает (ширину, высоту)."""
+    if not constant_time_compare(signature, sign(geometry, path)):
+        raise PermissionDenied
+    match = GEOMETRY.match(geometry)
+    if match is None:
+        raise Http404
+    width, height = (int(value) for value in match.groups())
+    if not (0 < width <= settings.RESIZE_MAX_SIZE
+            and 0 < height <= settings.RESIZE_MAX_SIZE):
+        raise Http404
+    return width, height
+
+
+def _resize(source, target, width, height, image_format, quality):
+    """Выполняется в процессе пула: вписывает картинку в размеры и пишет
+    результат атомарно, через временный файл."""
+    with Image.open(source) as image:
+        image.draft('RGB', (width, height))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, height), Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        temporary = f'{target}.{os.getpid()}.tmp'
+        image.save(temporary, image_format, quality=quality,
+                   progressive=True, optimize=True)
+    os.replace(temporary, target)
+
+
+def executor():
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.RESIZE_WORKERS)
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.RESIZE_QUEUE_LIMIT)
+    return _executor
+
+
+def _reset_executor(pool):
+    # Упавший пул больше не принимает задачи: следующий запрос создаст
+    # новый
+    global _executor
+    with _executor_lock:
+        if _executor is pool:
+            _executor = None
+
+
+def prune(directory, limit, keep):
+    """Удаляет давно не читанные файлы, кроме ``keep``, пока кэш больше
+    ``limit`` байт."""
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            stat = entry.stat()
+            total += stat.st_size
+            if entry.path != keep:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _run(source, target, width, height):
+    """Уменьшает картинку в пуле процессов и переводит ошибки пула
+    и декодирования в ответы: 503, 400 или 404."""
+    pool = executor()
+    if not _slots.acquire(blocking=False):
+        raise ResizeBusy
+    try:
+        future = pool.submit(
+            _resize, source, target, width, height,
+            settings.IMAGE_FORMAT, settings.IMAGE_QUALITY,
+        )
+    except BrokenProcessPool:
+        _slots.release()
+        _reset_executor(pool)
+        raise ResizeBusy
+    # Место в очереди занято, пока задача не завершится, даже если
+    # запрос перестал ее ждать
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        future.result(timeout=settings.RESIZE_TIMEOUT)
+    except TimeoutError:
+        raise ResizeBusy
+    except BrokenProcessPool:
+        _reset_executor(pool)
+        raise ResizeBusy
+    except Image.DecompressionBombError:
+        raise SuspiciousOperation(f'Слишком большая картинка {source}')
+    except OSError:
+        # Файл поврежден или не является картинкой
+        raise Http404
+
+
+def resized_path(path, width, height):
+    """Путь к уменьшенной копии в дисковом кэше; создает ее при промахе.
+
+    Имена в хранилище постов задаются хэшем содержимого, поэтому копия
+    не устаревает и ключ кэша - просто путь и размеры. Время изменения
+    файла служит отметкой последнего чтения для вытеснения по LRU.
+    """
+    storage = Post._meta.get_field('image').storage
+    if not path.startswith('posts/') or not storage.exists(path):
+        raise Http404
+    directory = settings.RESIZE_CACHE_DIR
+    key = hashlib.sha256(f'{width}x{height}/{path}'.encode()).hexdigest()
+    target = os.path.join(
+        directory, key + EXTENSIONS[settings.IMAGE_FORMAT])
+    if os.path.exists(target):
+        os.utime(target)
+        return target
+    os.makedirs(directory, exist_ok=True)
+    _run(storage.path(path), target, width, height)
+    prune(directory, settings.RESIZE_CACHE_MAX_BYTES, keep=target)
+    return target
+
+
+def serve(path, width, height):
+    """Ответ с уменьшенной копией: неизменяемый, кэшируемый на год.
+
+    Файл отдается через FileResponse, то есть через wsgi.file_wrapper
+    (sendfile), а при заданном RESIZE_ACCEL_REDIRECT - заголовком
+    X-Accel-Redirect, чтобы файл отдал сам nginx.
+    """
+    try:
+        target = resized_path(path, width, height)
+    except ResizeBusy:
+        response = HttpResponse(status=503)
+        response['Retry-After'] = '1'
+        return response
+    content_type = MIME_TYPES[settings.IMAGE_FORMAT]
+    if settings.RESIZE_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = (
+            settings.RESIZE_ACCEL_REDIRECT + os.path.basename(target))
+    else:
+        response = FileResponse(
+            open(target, 'rb'), content_type=content_type)
+    patch_cache_control(
+        response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response
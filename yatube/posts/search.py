@@ -0,0 +1,137 @@
+import math
+import re
+from collections import Counter
+
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Sum, Value, When)
+
+from .models import Post, PostTerm
+from .paginators import pk_range_estimate
+
+WORD = re.compile(r'\w+')
+VOWELS = 'аеиоуыэюя'
+STOP_WORDS = frozenset((
+    'а', 'без', 'бы', 'в', 'во', 'вот', 'вы', 'да', 'для', 'до', 'его',
+    'ее', 'если', 'есть', 'же', 'за', 'и', 'из', 'или', 'им', 'их', 'к',
+    'как', 'ко', 'ли', 'мы', 'на', 'над', 'не', 'нет', 'ни', 'но', 'о',
+    'об', 'он', 'она', 'они', 'оно', 'от', 'по', 'под', 'при', 'с', 'со',
+    'так', 'то', 'только', 'ты', 'у', 'уже', 'что', 'это', 'я',
+))
+
+# Окончания русского стеммера Портера (Snowball). Группы, которым
+# должна предшествовать «а» или «я», проверяются ретроспективой.
+PERFECTIVE_GERUND = re.compile(
+    r'(?:(?<=[ая])(?:в|вши|вшись)|ив|ивши|ившись|ыв|ывши|ывшись)$')
+REFLEXIVE = re.compile(r'(?:ся|сь)$')
+ADJECTIVE = (r'(?:ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|'
+             r'ему|ому|их|ых|ую|юю|ая|яя|ою|ею)')
+PARTICIPLE = r'(?:(?<=[ая])(?:ем|нн|вш|ющ|щ)|ивш|ывш|ующ)'
+ADJECTIVAL = re.compile(f'{PARTICIPLE}?{ADJECTIVE}$')
+VERB = re.compile(
+    r'(?:(?<=[ая])(?:ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)'
+    r'|ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|'
+    r'ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)$')
+NOUN = re.compile(
+    r'(?:а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|'
+    r'ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$')
+DERIVATIONAL = re.compile(r'ость?$')
+SUPERLATIVE = re.compile(r'(?:ейше|ейш)$')
+
+
+def _region(word, start=0):
+    """Начало области после первой согласной, идущей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _remove_ending(rv):
+    """Шаг 1: деепричастие, иначе возвратная частица и окончание
+    прилагательного, глагола или существительного."""
+    match = PERFECTIVE_GERUND.search(rv)
+    if match:
+        return rv[:match.start()]
+    rv = REFLEXIVE.sub('', rv)
+    for pattern in (ADJECTIVAL, VERB, NOUN):
+        match = pattern.search(rv)
+        if match:
+            return rv[:match.start()]
+    return rv
+
+
+def _tidy(rv):
+    """Шаг 4: двойная «н», превосходная степень и мягкий знак."""
+    if rv.endswith('нн'):
+        return rv[:-1]
+    match = SUPERLATIVE.search(rv)
+    if match:
+        rv = rv[:match.start()]
+        return rv[:-1] if rv.endswith('нн') else rv
+    return rv[:-1] if rv.endswith('ь') else rv
+
+
+def stem(word):
+    """Основа русского слова по стеммеру Портера; прочие слова
+    возвращаются как есть."""
+    match = re.search(f'[{VOWELS}]', word)
+    if match is None:
+        return word
+    start = match.end()
+    r2 = _region(word, _region(word))
+    rv = _remove_ending(word[start:])
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    match = DERIVATIONAL.search(rv)
+    if match and start + match.start() >= r2:
+        rv = rv[:match.start()]
+    return word[:start] + _tidy(rv)
+
+
+def tokenize(text):
+    """Основы значимых слов текста в порядке появления."""
+    words = WORD.findall(text.lower().replace('ё', 'е'))
+    return [stem(word)[:PostTerm.TERM_LENGTH] for word in words
+            if len(word) > 1 and word not in STOP_WORDS]
+
+
+def index_post(post):
+    """Пересобирает термы поста в обратном индексе."""
+    PostTerm.objects.filter(post=post).delete()
+    PostTerm.objects.bulk_create(
+        PostTerm(post=post, term=term, weight=weight)
+        for term, weight in Counter(tokenize(post.text)).items()
+    )
+
+
+def search(query, group=None, author=None):
+    """Посты, содержащие слова запроса, с релевантностью ``rank``.
+
+    Релевантность - сумма TF-IDF найденных термов: частота терма
+    в посте, умноженная на логарифм редкости терма среди постов.
+    Число постов с термом читается по индексу (term, post) одним
+    запросом, общее число постов оценивается по диапазону ключей.
+    """
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return Post.objects.none()
+    frequencies = PostTerm.objects.filter(term__in=terms).values_list(
+        'term').annotate(posts=Count('post')).order_by()
+    total = max(pk_range_estimate(Post.objects.all()), 1)
+    weights = [
+        When(terms__term=term, then=ExpressionWrapper(
+            F('terms__weight') * Value(math.log(1 + total / posts)),
+            output_field=FloatField(),
+        ))
+        for term, posts in frequencies
+    ]
+    if not weights:
+        return Post.objects.none()
+    posts = Post.objects.filter(terms__term__in=terms)
+    if group is not None:
+        posts = posts.filter(group=group)
+    if author is not None:
+        posts = posts.filter(author=author)
+    return posts.annotate(rank=Sum(Case(
+        *weights, default=Value(0.0), output_field=FloatField(),
+    ))).order_by('-rank', '-pk')
@@ -0,0 +1,135 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import autocomplete, counters, feeds, search, thumbnails
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .paginators import forget_counts
+from .versions import bump, post_scopes
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, **kwargs):
+    instance._previous_username = instance.username
+    update_fields = kwargs.get('update_fields')
+    if update_fields and 'username' not in update_fields:
+        return
+    if instance.pk is not None:
+        instance._previous_username = User.objects.filter(
+            pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+        autocomplete.user_changed(instance)
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    autocomplete.user_changed(instance)
+    # Имя автора выводится в карточках постов, а имя комментатора -
+    # в комментариях под постами
+    scopes = ['feed', f'author:{instance.pk}', f'user:{instance.pk}']
+    if instance.username != instance._previous_username:
+        scopes.extend(f'post:{pk}' for pk in Comment.objects.filter(
+            author=instance).values_list('post_id', flat=True).distinct())
+    bump(*scopes)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    autocomplete.user_deleted(instance)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    autocomplete.group_changed(instance)
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    autocomplete.group_deleted(instance)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    bump('feed', f'group:{instance.pk}')
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    instance._previous_group_id = None
+    instance._previous_image = None
+    if instance.pk is not None:
+        instance._previous_group_id, instance._previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, None))
+    if instance.image.name != instance._previous_image:
+        thumbnails.image_changed(instance)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.post_added(instance)
+        feeds.push_post(instance)
+        forget_counts('feed', f'group:{instance.group_id}',
+                      f'author:{instance.author_id}')
+    elif instance._previous_group_id != instance.group_id:
+        counters.post_moved(instance._previous_group_id, instance.group_id)
+        forget_counts(f'group:{instance._previous_group_id}',
+                      f'group:{instance.group_id}')
+    update_fields = kwargs.get('update_fields')
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance)
+    if instance.image.name != instance._previous_image:
+        thumbnails.release(instance._previous_image)
+        if instance.image:
+            thumbnails.schedule(instance)
+    bump(*post_scopes(instance, instance._previous_group_id))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.post_added(instance, -1)
+    thumbnails.release(instance.image.name)
+    feeds.forget_recent_posts(instance.author_id)
+    forget_counts('feed', f'group:{instance.group_id}',
+                  f'author:{instance.author_id}')
+    bump(*post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+        bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_added(instance, -1)
+    bump(f'post:{instance.post_id}')
+
+
+def follow_scopes(follow):
+    # Счетчики подписчиков и подписок выводятся в профилях обоих
+    return [f'follow:{follow.user_id}', f'author:{follow.user_id}',
+            f'author:{follow.author_id}']
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+        feeds.follow_added(instance.user_id, instance.author_id)
+        bump(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_added(instance, -1)
+    feeds.follow_removed(instance.user_id, instance.author_id)
+    bump(*follow_scopes(instance))
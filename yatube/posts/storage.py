@@ -0,0 +1,73 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы по хэшу содержимого: ``posts/ab/abcdef….jpg``.
+
+    Одинаковые загрузки получают одно имя и один файл на диске, а значит
+    и общий набор миниатюр. Файл удаляется, только когда на него больше
+    не ссылается ни один пост (см. posts.signals).
+    """
+    def hashed_name(self, name, digest):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, суффиксы для уникальности не нужны
+        return name
+
+    def _write(self, name, content):
+        # Файл пишется во временный и переименовывается: одновременное
+        # удаление или загрузка не оставят на месте имени пустой
+        # или недописанный файл
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                content.seek(0)
+                for chunk in content.chunks():
+                    file.write(chunk)
+            # mkstemp создает файл с правами 0600
+            mode = self.file_permissions_mode
+            os.chmod(temp, 0o644 if mode is None else mode)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def _restore(self, name, content):
+        # Очистка чужой транзакции могла удалить файл, пока пост
+        # с этой картинкой еще не был зафиксирован
+        if not self.exists(name) and not content.closed:
+            self._write(name, content)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content_hash(content))
+        # Запись выполняется и для существующего файла: проверка
+        # наличия и очистка после удаления поста могут пересечься
+        self._write(name, content)
+        transaction.on_commit(lambda: self._restore(name, content))
+        return name
+
+
+post_image_storage = ContentAddressedStorage()
@@ -0,0 +1,51 @@
+import hashlib
+
+from django import template
+
+from ..versions import get_or_compute
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.name = name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        vary_on = ':'.join(
+            str(var.resolve(context)) for var in self.vary_on)
+        key = 'fragment:{}:{}'.format(
+            self.name, hashlib.md5(vary_on.encode()).hexdigest())
+        return get_or_compute(
+            key,
+            self.version.resolve(context),
+            lambda: self.nodelist.render(context),
+            int(self.timeout.resolve(context)),
+        )
+
+
+@register.tag
+def fragment_cache(parser, token):
+    """Как ``{% cache %}``, но версия не входит в ключ, а хранится рядом
+    с фрагментом: устаревший фрагмент отдается, пока один запрос его
+    пересчитывает.
+
+    {% fragment_cache timeout name [vary_on ...] version=expr %}
+    """
+    nodelist = parser.parse(('endfragment_cache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 4 or not bits[-1].startswith('version='):
+        raise template.TemplateSyntaxError(
+            f'{bits[0]} tag requires timeout, name and version=')
+    return FragmentCacheNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:-1]],
+        parser.compile_filter(bits[-1][len('version='):]),
+    )
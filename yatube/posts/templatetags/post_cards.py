@@ -0,0 +1,10 @@
+from django import template
+
+from ..cards import attach_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def render_cards(posts):
+    return attach_cards(posts)
@@ -0,0 +1,25 @@
+from django import template
+from django.conf import settings
+
+from ..resize import resize_url
+from ..thumbnails import post_picture
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_image(post, size='card', lazy=False):
+    """Разметка <picture> с миниатюрами поста в нескольких форматах
+    и ширинах, а пока они генерируются - оригинал."""
+    return {
+        'post': post,
+        'picture': post_picture(post, size),
+        'sizes': settings.POST_IMAGE_SIZES,
+        'lazy': lazy,
+    }
+
+
+@register.simple_tag
+def resized_url(image, geometry):
+    """Подписанная ссылка на копию картинки, вписанную в ``geometry``."""
+    return resize_url(image.name, geometry)
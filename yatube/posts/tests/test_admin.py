@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+CHANGELISTS = (
+    reverse('admin:posts_post_changelist'),
+    reverse('admin:posts_comment_changelist'),
+    reverse('admin:posts_follow_changelist'),
+)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+            for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for i in range(count):
+            author = User.objects.create(
+                username=f'user-{Post.objects.count()}')
+            post = Post.objects.create(
+                text=f'Пост {i}', author=author,
+                group=self.groups[i % len(self.groups)])
+            Comment.objects.create(post=post, author=author, text='Текст')
+            Follow.objects.create(user=author, author=self.admin)
+
+    def queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in context.captured_queries]
+
+    def test_queries_do_not_depend_on_rows(self):
+        """Число запросов списка не зависит от числа строк"""
+        self.add_rows(2)
+        counts = [len(self.queries(url)) for url in CHANGELISTS]
+        self.add_rows(8)
+        for url, count in zip(CHANGELISTS, counts):
+            with self.subTest(url=url):
+                self.assertEqual(len(self.queries(url)), count)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=1)
+    def test_large_tables_are_not_counted(self):
+        """Для больших таблиц без фильтров COUNT(*) не выполняется"""
+        self.add_rows(2)
+        for url in CHANGELISTS:
+            with self.subTest(url=url):
+                self.assertEqual([
+                    sql for sql in self.queries(url) if 'COUNT(' in sql], [])
+
+    def test_post_search_uses_index(self):
+        """Поиск постов идет по обратному индексу, а не по LIKE"""
+        self.add_rows(2)
+        Post.objects.create(
+            text='Редкие книги', author=self.admin, group=self.groups[0])
+        url = CHANGELISTS[0]
+        queries = self.queries(url, q='книга')
+        self.assertFalse(any('LIKE' in sql for sql in queries))
+        response = self.client.get(url, {'q': 'книга'})
+        self.assertEqual(
+            [post.text for post in response.context['cl'].result_list],
+            ['Редкие книги'])
+
+    def test_post_search_matches_all_words(self):
+        """Пост находится, только если содержит все слова запроса;
+        запрос из одних стоп-слов ничего не находит"""
+        Post.objects.create(text='Редкие книги', author=self.admin)
+        Post.objects.create(text='Редкие марки', author=self.admin)
+        url = CHANGELISTS[0]
+        for query, expected in (('редкая книга', ['Редкие книги']),
+                                ('книга марка', []),
+                                ('и в на', [])):
+            with self.subTest(query=query):
+                response = self.client.get(url, {'q': query})
+                self.assertEqual(
+                    [post.text for post in response.context['cl'].result_list],
+                    expected)
+
+    def test_foreign_keys_use_autocomplete(self):
+        """Связи в формах выбираются автодополнением"""
+        for name in ('post', 'comment', 'follow'):
+            with self.subTest(model=name):
+                response = self.client.get(
+                    reverse(f'admin:posts_{name}_add'))
+                self.assertContains(response, 'admin-autocomplete')
@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+
+from .. import autocomplete
+from ..autocomplete import PrefixIndex
+from ..models import Follow, Group, User
+
+AUTOCOMPLETE = reverse('posts:autocomplete')
+
+
+class PrefixIndexTests(TestCase):
+    def test_search_by_prefix_and_rank(self):
+        """Записи ищутся по любому ключу и выводятся по рангу"""
+        index = PrefixIndex()
+        index.add(1, ('anna',), 'anna', 1)
+        index.add(2, ('andrey',), 'andrey', 5)
+        index.add(3, ('boris', 'anime'), 'boris', 3)
+        index.add(4, ('ann',), 'ann', 0)
+        self.assertEqual(
+            index.search('An', 10), ['andrey', 'boris', 'anna', 'ann'])
+        self.assertEqual(index.search('ann', 1), ['anna'])
+        self.assertEqual(index.search('x', 10), [])
+
+    def test_short_prefixes_follow_changes(self):
+        """Запомненные лучшие записи коротких префиксов обновляются"""
+        index = PrefixIndex(top=2)
+        index.extend([(1, ('anna',), 'anna', 1), (2, ('andrey',), 'andrey', 5),
+                      (3, ('ann',), 'ann', 0)])
+        self.assertEqual(index.search('a', 2), ['andrey', 'anna'])
+        index.add(4, ('alex',), 'alex', 3)
+        self.assertEqual(index.search('a', 2), ['andrey', 'alex'])
+        index.remove(2)
+        self.assertEqual(index.search('a', 2), ['alex', 'anna'])
+        self.assertEqual(index.search('a', 5), ['alex', 'anna', 'ann'])
+
+    def test_update_and_remove(self):
+        """Новые ключи записи заменяют старые"""
+        index = PrefixIndex()
+        index.add(1, ('old',), 'first')
+        index.add(1, ('new',), 'renamed')
+        self.assertEqual(index.search('old', 10), [])
+        self.assertEqual(index.search('ne', 10), ['renamed'])
+        index.remove(1)
+        self.assertEqual(index.search('ne', 10), [])
+        self.assertEqual(len(index), 0)
+
+
+class AutocompleteTests(TransactionTestCase):
+    # Индекс обновляется после фиксации транзакций
+    def setUp(self):
+        self.popular = User.objects.create(username='maria')
+        self.quiet = User.objects.create(username='mark')
+        Follow.objects.create(user=self.quiet, author=self.popular)
+        self.group = Group.objects.create(
+            title='Машинное обучение', slug='ml', description='')
+        cache.clear()
+        autocomplete._index = None
+
+    def test_endpoint_answers_without_queries(self):
+        """Собранный индекс отвечает без запросов к базе"""
+        autocomplete.get_index()
+        with self.assertNumQueries(0):
+            response = self.client.get(AUTOCOMPLETE, {'q': 'mar'})
+        self.assertEqual(
+            [item['label'] for item in response.json()['results']],
+            ['maria', 'mark'])
+        self.assertEqual(response.json()['results'][0]['url'],
+                         reverse('posts:profile', args=('maria',)))
+
+    def test_groups_by_slug_and_title(self):
+        """Группы находятся по адресу и по названию"""
+        for prefix in ('ml', 'маш'):
+            with self.subTest(prefix=prefix):
+                self.assertEqual(
+                    [item['url'] for item in autocomplete.suggest(prefix)],
+                    [reverse('posts:group_list', args=('ml',))])
+
+    def test_index_is_updated_on_save(self):
+        """Сохранение и удаление меняют индекс без пересборки"""
+        index = autocomplete.get_index()
+        User.objects.create(username='marta')
+        self.group.slug = 'machine'
+        self.group.save()
+        self.assertIs(autocomplete.get_index(), index)
+        self.assertIn('marta', [item['label']
+                                for item in autocomplete.suggest('mart')])
+        self.assertEqual(autocomplete.suggest('ml'), [])
+        self.assertEqual(len(autocomplete.suggest('mach')), 1)
+        self.quiet.delete()
+        self.assertNotIn('mark', [item['label']
+                                  for item in autocomplete.suggest('mar')])
+
+    def test_rolled_back_changes_are_ignored(self):
+        """Отмененная транзакция не попадает в индекс"""
+        autocomplete.get_index()
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            User.objects.create(username='marina')
+            raise RuntimeError
+        self.assertNotIn('marina', [item['label']
+                                    for item in autocomplete.suggest('mar')])
+
+    def test_other_process_changes_rebuild(self):
+        """Изменение в другом процессе пересобирает индекс"""
+        index = autocomplete.get_index()
+        autocomplete.bump(autocomplete.SCOPE)
+        # Пока индекс пересобирается в фоне, отвечает прежний
+        self.assertIs(autocomplete.get_index(), index)
+        autocomplete.executor().submit(lambda: None).result()
+        self.assertIsNot(autocomplete.get_index(), index)
@@ -0,0 +1,135 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import bulk, counters
+from ..models import Comment, Group, Post, PostTerm, User, UserStats
+
+POSTS = reverse('admin:posts_post_changelist')
+COMMENTS = reverse('admin:posts_comment_changelist')
+
+
+def snapshot():
+    return (
+        list(Group.objects.order_by('pk').values_list('post_count')),
+        list(Post.objects.order_by('pk').values_list('comment_count')),
+        list(UserStats.objects.order_by('pk').values_list('post_count')),
+    )
+
+
+@override_settings(BULK_CHUNK_SIZE=2)
+class BulkActionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.spammer = User.objects.create(username='spammer')
+        cls.old, cls.new = (
+            Group.objects.create(title=title, slug=title)
+            for title in ('old', 'new'))
+        cls.posts = [Post.objects.create(
+            text=f'Пост {i}', author=cls.spammer if i % 2 else cls.admin,
+            group=cls.old) for i in range(5)]
+        for post in cls.posts:
+            Comment.objects.create(
+                post=post, author=cls.spammer, text='Спам')
+            Comment.objects.create(
+                post=post, author=cls.admin, text='Ответ')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def assertCountersConsistent(self):
+        current = snapshot()
+        counters.recount()
+        self.assertEqual(current, snapshot())
+
+    def test_move_posts(self):
+        """Перенос постов меняет группы и их счетчики"""
+        moved = bulk.move_posts(Post.objects.all(), self.new)
+        self.assertEqual(moved, 5)
+        self.assertEqual(self.new.posts.count(), 5)
+        self.assertCountersConsistent()
+
+    def test_delete_posts(self):
+        """Удаление постов убирает комментарии, термы и счетчики"""
+        pks = [post.pk for post in self.posts[:3]]
+        bulk.delete_posts(Post.objects.filter(pk__in=pks))
+        self.assertFalse(Post.objects.filter(pk__in=pks).exists())
+        self.assertFalse(Comment.objects.filter(post_id__in=pks).exists())
+        self.assertFalse(PostTerm.objects.filter(post_id__in=pks).exists())
+        self.assertCountersConsistent()
+
+    def test_delete_comments(self):
+        """Удаление комментариев обновляет их счетчики у постов"""
+        bulk.delete_comments(Comment.objects.filter(author=self.spammer))
+        self.assertFalse(Comment.objects.filter(author=self.spammer).exists())
+        self.assertCountersConsistent()
+
+    def test_chunks_report_progress(self):
+        """Операция идет пачками и сообщает о ходе"""
+        reports = []
+        bulk.move_posts(Post.objects.all(), None, report=reports.append)
+        self.assertEqual(reports, [2, 4, 5])
+
+    def test_admin_actions(self):
+        """Действия админки переносят посты и удаляют комментарии авторов"""
+        self.client.post(POSTS, {
+            'action': 'bulk_move',
+            '_selected_action': [self.posts[0].pk, self.posts[1].pk],
+            'target_group': self.new.pk,
+        })
+        self.assertEqual(self.new.posts.count(), 2)
+        response = self.client.post(POSTS, {
+            'action': 'bulk_move',
+            '_selected_action': [self.posts[2].pk],
+            'target_group': '',
+        }, follow=True)
+        self.assertContains(response, 'Выберите группу')
+        self.assertEqual(self.old.posts.count(), 3)
+        self.client.post(POSTS, {
+            'action': 'bulk_ungroup',
+            '_selected_action': [self.posts[2].pk],
+        })
+        self.assertEqual(self.old.posts.count(), 2)
+        comment = Comment.objects.filter(author=self.spammer).first()
+        response = self.client.post(COMMENTS, {
+            'action': 'bulk_delete_by_authors',
+            '_selected_action': [comment.pk],
+        }, follow=True)
+        self.assertContains(response, 'Удалено комментариев: 5')
+        self.assertEqual(Comment.objects.count(), 5)
+        self.assertCountersConsistent()
+
+    @override_settings(BULK_BACKGROUND_THRESHOLD=1)
+    def test_large_selection_runs_in_background(self):
+        """Большая выборка обрабатывается в фоне с отчетом о ходе"""
+        with patch.object(bulk, 'transaction') as transaction:
+            count, task = bulk.start(
+                bulk.delete_posts, Post.objects.all())
+        self.assertEqual(count, 5)
+        self.assertEqual(Post.objects.count(), 5)
+        url = reverse('admin:posts_post_bulk', args=(task,))
+        self.assertEqual(self.client.get(url).json()['done'], 0)
+        with patch.object(bulk, 'connection'):
+            bulk._run(task, bulk.delete_posts, Post.objects.all(), ())
+        transaction.on_commit.assert_called_once()
+        state = self.client.get(url).json()
+        self.assertEqual((state['done'], state['finished'], state['failed'],
+                          state['stale']), (5, True, False, False))
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(BULK_BACKGROUND_THRESHOLD=1, BULK_STALE_TIMEOUT=60)
+    def test_lost_background_task_is_stale(self):
+        """Операция, потерянная при перезапуске, помечается устаревшей"""
+        with patch.object(bulk, 'transaction'):
+            _, task = bulk.start(bulk.delete_posts, Post.objects.all())
+        state = bulk.progress(task)
+        self.assertFalse(state['stale'])
+        with patch('posts.bulk.time.time', return_value=state['updated'] + 61):
+            state = bulk.progress(task)
+        self.assertEqual((state['finished'], state['stale']), (False, True))
@@ -1,9 +1,15 @@
+from unittest.mock import patch
+
 from django.conf import settings
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 
-from ..models import Post, User
+from ..cards import attach_cards
+from ..models import Comment, Follow, Group, Post, User
+from ..versions import FRAGMENT_STATS, bump, cache_version, get_or_compute
 
 INDEX = reverse('posts:index')
 
@@ -13,38 +19,281 @@ class CacheTests(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.author = User.objects.create(username=settings.USER_NAME)
+        cls.group = Group.objects.create(
+            title=settings.GROUP_TITLE,
+            slug=settings.SLUG,
+            description=settings.DESCRIPTION
+        )
         cls.post = Post.objects.create(
             text=settings.POST_TEXT,
             author=cls.author,
+            group=cls.group,
             image=None,
         )
+        cls.urls = (
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': settings.SLUG}),
+            reverse('posts:profile',
+                    kwargs={'username': settings.USER_NAME}),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
 
     def setUp(self):
         self.guest_client = Client()
         cache.clear()
 
-    def test_page_correct_template(self):
-        """Кэширование данных"""
-        response = self.client.get(INDEX)
-        cached_response_content = response.content
-        Post.objects.create(text='Второй пост', author=self.author)
-        response = self.client.get(INDEX)
-        self.assertEqual(cached_response_content, response.content)
+    def test_pages_are_cached(self):
+        """Изменения в обход сигналов не видны до сброса кэша"""
+        for url in self.urls:
+            self.guest_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotContains(response, 'Тихая правка')
         cache.clear()
-        response = self.client.get(INDEX)
-        self.assertNotEqual(cached_response_content, response.content)
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Тихая правка')
 
-    def test_index_page_caches_content_for_anonymous(self):
-        """Кэшированный контент для неавторизованного пользователя"""
-        post = Post.objects.create(
-            text='Тестируем кеш',
-            author=self.author
-        )
-        response = self.guest_client.get(INDEX)
-        content_old = response.content
+    def test_new_post_invalidates_cache(self):
+        """Новый пост сразу виден на главной, в группе и профиле"""
+        for url in self.urls[:3]:
+            self.guest_client.get(url)
+        Post.objects.create(
+            text='Второй пост', author=self.author, group=self.group)
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Второй пост')
+
+    def test_deleted_post_disappears(self):
+        """Удаленный пост сразу пропадает с главной"""
+        post = Post.objects.create(text='Тестируем кеш', author=self.author)
+        self.assertContains(self.guest_client.get(INDEX), 'Тестируем кеш')
         post.delete()
-        response = self.guest_client.get(INDEX)
-        self.assertEqual(response.content, content_old)
+        self.assertNotContains(self.guest_client.get(INDEX), 'Тестируем кеш')
+
+    def test_edit_and_comment_invalidate_detail(self):
+        """Правка поста и комментарий сбрасывают кэш страницы поста"""
+        url = self.urls[3]
+        self.guest_client.get(url)
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Новый комментарий')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Исправленный текст')
+        self.assertContains(response, 'Новый комментарий')
+
+
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        cls.post = Post.objects.create(
+            text=settings.POST_TEXT, author=cls.author)
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_not_modified(self):
+        """Повторный условный запрос гостя получает 304"""
+        response = self.guest_client.get(self.url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        for header, value in (
+                ('HTTP_IF_NONE_MATCH', response['ETag']),
+                ('HTTP_IF_MODIFIED_SINCE', response['Last-Modified'])):
+            with self.subTest(header=header):
+                conditional = self.guest_client.get(
+                    self.url, **{header: value})
+                self.assertEqual(conditional.status_code, 304)
+
+    def test_last_modified_survives_cache_loss(self):
+        """Страницы без отметок в кэше тоже получают Last-Modified"""
+        urls = (reverse('posts:index'), self.url,
+                reverse('posts:profile', args=(self.author.username,)))
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                first = self.guest_client.get(url)
+                self.assertTrue(first.has_header('Last-Modified'))
+                self.assertEqual(
+                    self.guest_client.get(url)['Last-Modified'],
+                    first['Last-Modified'])
+
+    def test_etag_changes_with_comment(self):
+        """Новый комментарий меняет ETag страницы поста"""
+        etag = self.guest_client.get(self.url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        response = self.guest_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Комментарий')
+
+    def test_follow_changes_profile(self):
+        """Подписка меняет ETag и счетчики профилей обоих пользователей"""
+        reader = User.objects.create(username='reader')
+        urls = [reverse('posts:profile', kwargs={'username': user.username})
+                for user in (self.author, reader)]
+        etags = [self.guest_client.get(url)['ETag'] for url in urls]
+        Follow.objects.create(user=reader, author=self.author)
+        for url, etag, text in zip(urls, etags, (
+                'Подписчиков: 1', 'подписок: 1')):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, text)
+
+    def test_group_change_invalidates_post(self):
+        """Переименование группы сбрасывает кэш страницы ее поста"""
+        group = Group.objects.create(
+            title='Старое название', slug='group', description='')
+        post = Post.objects.create(
+            text=settings.POST_TEXT, author=self.author, group=group)
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        etag = self.guest_client.get(url)['ETag']
+        group.title = 'Новое название'
+        group.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Новое название')
+
+    def test_rename_invalidates_comments(self):
+        """Новое имя комментатора сразу видно под постом"""
+        reader = User.objects.create(username='reader')
+        Comment.objects.create(
+            post=self.post, author=reader, text='Комментарий')
+        self.assertContains(self.guest_client.get(self.url), 'reader')
+        reader.username = 'renamed'
+        reader.save()
+        self.assertContains(self.guest_client.get(self.url), 'renamed')
+
+    def test_authorized_pages_are_not_shared(self):
+        """Авторизованный пользователь не получает страницу гостя"""
+        etag = self.guest_client.get(self.url)['ETag']
+        client = Client()
+        client.force_login(self.author)
+        response = client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+        self.assertContains(response, 'csrfmiddlewaretoken')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        Post.objects.bulk_create(Post(
+            text=f'{settings.POST_TEXT} {i}',
+            author=cls.author,
+        ) for i in range(settings.POSTS_ON_PAGE))
+
+    def setUp(self):
         cache.clear()
-        response = self.guest_client.get(INDEX)
-        self.assertNotEqual(response.content, content_old)
+
+    def test_cards_are_reused_between_pages(self):
+        """Карточки берутся из кэша, даже если страница перерисована"""
+        self.client.get(INDEX)
+        Post.objects.update(text='Тихая правка')
+        bump('feed')
+        self.assertNotContains(self.client.get(INDEX), 'Тихая правка')
+        post = Post.objects.first()
+        post.save()
+        self.assertContains(self.client.get(INDEX), 'Тихая правка', 1)
+
+    def test_cards_are_fetched_in_one_call(self):
+        """Страница карточек читается одним get_many"""
+        posts = list(Post.objects.all())
+        attach_cards(posts)
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(0):
+            cards = [post.card for post in attach_cards(posts)]
+        self.assertEqual(len(cards), settings.POSTS_ON_PAGE)
+        self.assertIn(settings.POST_TEXT, cards[0])
+
+    def test_only_first_card_image_is_eager(self):
+        """Картинки всех карточек, кроме первой, загружаются лениво"""
+        Post.objects.update(image='posts/picture.jpg')
+        with patch('posts.thumbnails.schedule'):
+            cards = [post.card for post in attach_cards(Post.objects.all())]
+        self.assertNotIn('loading="lazy"', cards[0])
+        for card in cards[1:]:
+            self.assertIn('loading="lazy"', card)
+
+
+@override_settings(FRAGMENT_WAIT_TIMEOUT=0.1)
+class StampedeTests(TestCase):
+    KEY = 'fragment:test'
+
+    def setUp(self):
+        cache.clear()
+        FRAGMENT_STATS.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def test_fresh_entry_is_not_recomputed(self):
+        """Свежая запись текущей версии отдается без пересчета."""
+        get_or_compute(self.KEY, 'v1', self.compute, 60)
+        with patch('posts.versions._expires_early', return_value=False):
+            value = get_or_compute(self.KEY, 'v1', self.compute, 60)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(FRAGMENT_STATS['fresh'], 1)
+
+    def test_stale_entry_is_served_while_locked(self):
+        """Пока другой запрос пересчитывает, отдается старая версия."""
+        get_or_compute(self.KEY, 'v1', self.compute, 60)
+        cache.add(f'{self.KEY}:lock', 1)
+        value = get_or_compute(self.KEY, 'v2', self.compute, 60)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(FRAGMENT_STATS['stale'], 1)
+
+    def test_new_version_is_computed_once(self):
+        """Новая версия пересчитывается захватившим блокировку."""
+        get_or_compute(self.KEY, 'v1', self.compute, 60)
+        value = get_or_compute(self.KEY, 'v2', self.compute, 60)
+        self.assertEqual(value, 'value 2')
+        self.assertIsNone(cache.get(f'{self.KEY}:lock'))
+        self.assertEqual(FRAGMENT_STATS['recomputed'], 2)
+
+    def test_early_expiration(self):
+        """Запись может быть пересчитана до истечения срока."""
+        get_or_compute(self.KEY, 'v1', self.compute, 60)
+        with patch('posts.versions._expires_early', return_value=True):
+            value = get_or_compute(self.KEY, 'v1', self.compute, 60)
+        self.assertEqual(value, 'value 2')
+        self.assertEqual(FRAGMENT_STATS['early'], 1)
+
+    def test_waiter_computes_after_timeout(self):
+        """Без записи и блокировки запрос ждет и в итоге считает сам."""
+        cache.add(f'{self.KEY}:lock', 1)
+        value = get_or_compute(self.KEY, 'v1', self.compute, 60)
+        self.assertEqual(value, 'value 1')
+        self.assertEqual(FRAGMENT_STATS['timeout'], 1)
+
+
+class BumpAfterCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_repeats_after_commit(self):
+        """Внутри транзакции версия сдвигается еще раз после фиксации"""
+        with transaction.atomic():
+            bump('feed')
+            inside = cache_version('feed')
+        self.assertNotEqual(cache_version('feed'), inside)
+        outside = cache_version('feed')
+        bump('feed')
+        self.assertNotEqual(cache_version('feed'), outside)
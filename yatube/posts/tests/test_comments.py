@@ -1,4 +1,7 @@
-from django.test import Client, TestCase
+import re
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Comment, Post, User
@@ -44,3 +47,63 @@ class CommentTests(TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(
             response, f'/auth/login/?next=/posts/{self.post.pk}/comment/')
+
+
+@override_settings(COMMENTS_ON_PAGE=3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='backend')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+        for i in range(7):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Комментарий {i}')
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        cache.clear()
+
+    @staticmethod
+    def texts(response):
+        return re.findall(r'Комментарий \d+', response.content.decode())
+
+    @staticmethod
+    def next_url(response):
+        match = re.search(r'href="([^"]+/comments/\?cursor=[^"]+)"',
+                          response.content.decode())
+        return match and match.group(1)
+
+    def test_comments_are_paginated(self):
+        """На странице поста только первая страница комментариев,
+        остальные подгружаются фрагментами по курсору"""
+        response = self.client.get(self.detail_url)
+        found = self.texts(response)
+        self.assertEqual(found, [f'Комментарий {i}' for i in range(3)])
+        self.assertContains(response, 'Комментариев: 7')
+        url = self.next_url(response)
+        while url:
+            response = self.client.get(url)
+            self.assertNotContains(response, '<html')
+            found.extend(self.texts(response))
+            url = self.next_url(response)
+        self.assertEqual(found, [f'Комментарий {i}' for i in range(7)])
+
+    def test_exhausted_cursor_returns_empty_fragment(self):
+        """Курсор после удаленных комментариев не повторяет первые"""
+        response = self.client.get(self.detail_url)
+        url = self.next_url(response)
+        Comment.objects.filter(
+            post=self.post, text__in=[f'Комментарий {i}'
+                                      for i in range(3, 7)]).delete()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.texts(response), [])
+        self.assertIsNone(self.next_url(response))
+
+    def test_missing_post(self):
+        """Фрагмент комментариев несуществующего поста - 404"""
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
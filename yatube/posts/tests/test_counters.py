@@ -0,0 +1,71 @@
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Group, Post, User, UserStats
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create(username=settings.USER_NAME)
+        self.reader = User.objects.create(username='reader')
+        self.group = Group.objects.create(
+            title=settings.GROUP_TITLE,
+            slug=settings.SLUG,
+            description=settings.DESCRIPTION
+        )
+        self.post = Post.objects.create(
+            text=settings.POST_TEXT, author=self.author, group=self.group)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_post_counters(self):
+        """Создание, перенос и удаление поста меняют счетчики"""
+        self.assertEqual(self.stats(self.author).post_count, 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        self.post.group = None
+        self.post.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 0)
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).post_count, 0)
+
+    def test_comment_and_follow_counters(self):
+        """Комментарии и подписки меняют счетчики"""
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).follower_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        Follow.objects.all().delete()
+        self.assertEqual(self.stats(self.author).follower_count, 0)
+
+    def test_recount_command(self):
+        """Команда recount_counters исправляет разошедшиеся счетчики"""
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        UserStats.objects.update(
+            post_count=7, follower_count=7, following_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        Post.objects.update(comment_count=7)
+        Group.objects.update(post_count=7)
+        call_command('recount_counters', stdout=StringIO())
+        author, reader = self.stats(self.author), self.stats(self.reader)
+        self.assertEqual(
+            (author.post_count, author.follower_count, reader.following_count),
+            (1, 1, 1),
+        )
+        self.post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual((self.post.comment_count, self.group.post_count),
+                         (1, 1))
@@ -1,7 +1,13 @@
-from django.test import Client, TestCase
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from posts.models import Follow, Post, User
+from posts import feeds
+from posts.models import Follow, Post, TimelineEntry, User
 
 
 class FollowTests(TestCase):
@@ -59,3 +65,129 @@ class FollowTests(TestCase):
                                         follow=True)
         response = self.client_auth_following.get(f'/posts/{self.post.pk}/')
         self.assertNotContains(response, 'комментарий от гостя')
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.follower = User.objects.create(username='follower')
+        self.author = User.objects.create(username='author')
+        self.old_post = Post.objects.create(author=self.author, text='Старый')
+        self.client_auth = Client()
+        self.client_auth.force_login(self.follower)
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.follower).values_list('post_id', flat=True))
+
+    def test_follow_fills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+    def test_new_post_pushed_to_followers(self):
+        """Новый пост раскладывается по лентам подписчиков"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый')
+        response = self.client_auth.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [post, self.old_post])
+
+    def test_unfollow_and_delete_prune_timeline(self):
+        """Отписка и удаление поста убирают записи из ленты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.old_post.delete()
+        self.assertEqual(self.timeline(), [])
+        Post.objects.create(author=self.author, text='Новый')
+        self.client_auth.get(reverse('posts:profile_unfollow',
+                                     kwargs={'username': 'author'}))
+        self.assertEqual(self.timeline(), [])
+
+    def test_backfill_command(self):
+        """Команда backfill_timeline восстанавливает ленты"""
+        Follow.objects.create(user=self.follower, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('backfill_timeline', stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.old_post.pk])
+
+
+@override_settings(FEED_PULL_THRESHOLD=2, FEED_PULL_CACHE_SIZE=3)
+class HybridFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.star = User.objects.create(username='star')
+        self.author = User.objects.create(username='author')
+        self.readers = [User.objects.create(username=f'reader{i}')
+                        for i in range(3)]
+        for reader in self.readers[:2]:
+            Follow.objects.create(user=reader, author=self.star)
+            Follow.objects.create(user=reader, author=self.author)
+        self.client_auth = Client()
+        self.client_auth.force_login(self.readers[0])
+
+    def feed(self, cursor=''):
+        response = self.client_auth.get(
+            reverse('posts:follow_index') + f'?cursor={cursor}')
+        return response.context['page_obj']
+
+    def test_popular_author_is_not_fanned_out(self):
+        """Посты популярного автора не пишутся в ленты, но видны в них"""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(list(self.feed()), [post])
+
+    @override_settings(POST_LIMIT=2)
+    def test_feeds_are_merged_by_date(self):
+        """Разложенная лента и посты популярных авторов сливаются по дате"""
+        posts = [
+            Post.objects.create(
+                author=self.star if i % 2 else self.author, text=str(i))
+            for i in range(7)
+        ]
+        expected = posts[::-1]
+        page = self.feed()
+        collected = list(page)
+        while page.next_cursor:
+            page = self.feed(page.next_cursor)
+            collected.extend(page)
+        self.assertEqual(collected, expected)
+        page = self.feed(page.previous_cursor)
+        self.assertEqual(list(page), expected[4:6])
+
+    @override_settings(FEED_PUSH_THRESHOLD=2)
+    def test_unfollow_below_threshold_fills_timelines(self):
+        """Когда автор перестает быть популярным, ленты догружаются
+        в фоне после фиксации транзакции"""
+        post = Post.objects.create(author=self.star, text='Звезда')
+        callbacks = []
+        with patch('posts.feeds.transaction.on_commit', callbacks.append), \
+                patch('posts.feeds.executor') as executor:
+            Follow.objects.filter(
+                user=self.readers[1], author=self.star).delete()
+            self.assertFalse(feeds.is_pull_author(self.star.pk))
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            for callback in callbacks:
+                callback()
+        executor().submit.assert_called_once_with(
+            feeds._run_backfill, self.star.pk)
+        feeds.backfill_author(self.star.pk)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.readers[0], post=post).exists())
+
+    @override_settings(FEED_PUSH_THRESHOLD=1)
+    def test_mode_changes_with_hysteresis(self):
+        """Между порогами режим автора не меняется"""
+        callbacks = []
+        with patch('posts.feeds.transaction.on_commit', callbacks.append), \
+                patch('posts.feeds.executor') as executor:
+            Follow.objects.filter(
+                user=self.readers[1], author=self.star).delete()
+            Follow.objects.create(user=self.readers[1], author=self.star)
+            Follow.objects.filter(
+                user=self.readers[1], author=self.star).delete()
+            for callback in callbacks:
+                callback()
+        executor.assert_not_called()
+        self.assertTrue(feeds.is_pull_author(self.star.pk))
+        self.assertIn(
+            self.star.pk, feeds.followed_pull_authors(self.readers[0]))
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from http import HTTPStatus
 
@@ -8,7 +9,9 @@ from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from posts.forms import PostForm
 from posts.models import Group, Post, User
 
 CREATE = reverse('posts:post_create')
@@ -80,7 +83,7 @@ class PostsPagesTests(TestCase):
         self.assertEqual(Post.objects.count(), post_count + 1)
         self.assertTrue(Post.objects.filter(
             author=self.author,
-            image='posts/small.gif',
+            image__regex=r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$',
             text=form_data['text'],
         ).exists(),
             f'Ошибка при создании формы: author={self.author}, '
@@ -107,3 +110,51 @@ class PostsPagesTests(TestCase):
         self.assertTrue(Post.objects.filter(
             group=form_data['group']).exists(),
         )
+
+
+def jpeg(size, orientation=None):
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    exif[0x010F] = 'Камера'
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(
+        'photo.jpeg', buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIZE=100)
+class ImageNormalizationTests(TestCase):
+    def form(self, upload):
+        return PostForm(data={'text': 'text'}, files={'image': upload})
+
+    def test_image_is_downscaled_and_stripped(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет метаданные"""
+        form = self.form(jpeg((400, 200), orientation=6))
+        self.assertTrue(form.is_valid(), form.errors)
+        stored = form.cleaned_data['image']
+        self.assertEqual(stored.name, 'photo.jpg')
+        image = Image.open(stored)
+        self.assertEqual(image.size, (50, 100))
+        self.assertFalse(image.getexif())
+        self.assertTrue(image.info.get('progressive'))
+
+    @override_settings(IMAGE_MAX_PIXELS=1000)
+    def test_decompression_bomb_is_rejected(self):
+        """Слишком большая по пикселям картинка отклоняется"""
+        form = self.form(jpeg((100, 100)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_truncated_image_is_rejected(self):
+        """Обрезанный файл картинки отклоняется ошибкой формы"""
+        buffer = BytesIO()
+        Image.effect_noise((400, 400), 64).convert('RGB').save(
+            buffer, 'JPEG')
+        content = buffer.getvalue()
+        upload = SimpleUploadedFile(
+            'photo.jpeg', content[:len(content) * 7 // 10],
+            content_type='image/jpeg')
+        form = self.form(upload)
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+
+from ..feeds import TimelinePaginator
+from ..models import Comment, Follow, Group, Post, TimelineEntry, User
+from ..paginators import CursorPaginator
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """Основные запросы страниц идут по индексам без сортировки"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title=settings.GROUP_TITLE,
+            slug=settings.SLUG,
+            description=settings.DESCRIPTION
+        )
+        cls.post = Post.objects.create(
+            text=settings.POST_TEXT, author=cls.author, group=cls.group)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('TEMP B-TREE', plan)
+        for line in plan.splitlines():
+            if 'SCAN' in line:
+                self.assertIn('INDEX', line, plan)
+
+    def page_query(self, paginator, values=None):
+        ordering = paginator.ordering
+        queryset = paginator.object_list.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(
+                paginator._keyset_filter(values, 'lt'))
+        return queryset[:paginator.per_page + 1]
+
+    def test_feed_queries(self):
+        """Ленты: главная, группы, автора и подписок"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План проверяется для SQLite')
+        key = [self.post.pub_date, self.post.pk]
+        feeds = (
+            Post.objects.select_related('author', 'group'),
+            self.group.posts.select_related('author'),
+            self.author.posts.select_related('group'),
+        )
+        for queryset in feeds:
+            paginator = CursorPaginator(queryset, settings.POSTS_ON_PAGE)
+            for values in (None, key):
+                with self.subTest(query=str(queryset.query), values=values):
+                    self.assertUsesIndex(self.page_query(paginator, values))
+        timeline = TimelinePaginator(
+            TimelineEntry.objects.filter(user=self.reader),
+            settings.POST_LIMIT,
+        )
+        self.assertUsesIndex(self.page_query(timeline, key))
+
+    def test_lookup_queries(self):
+        """Комментарии поста и проверка подписки"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('План проверяется для SQLite')
+        self.assertUsesIndex(
+            Comment.objects.filter(post=self.post).order_by('created', 'pk'))
+        self.assertUsesIndex(
+            Follow.objects.filter(user=self.reader, author=self.author))
+        self.assertUsesIndex(Follow.objects.filter(
+            user=self.reader,
+            author__stats__pull_feed=True,
+        ))
@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Group, Post, User
+from ..paginators import (CursorPaginator, WindowedPaginator, decode_cursor,
+                          encode_cursor)
+
+INDEX = reverse('posts:index')
+POSTS_COUNT = 25
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        cls.group = Group.objects.create(
+            title=settings.GROUP_TITLE,
+            slug=settings.SLUG,
+            description=settings.DESCRIPTION
+        )
+        Post.objects.bulk_create(Post(
+            text=f'{settings.POST_TEXT} {i}',
+            group=cls.group,
+            author=cls.author,
+        ) for i in range(POSTS_COUNT))
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_pages_follow_each_other(self):
+        """Курсоры проходят ленту целиком без пропусков и повторов"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_page(None)
+        collected = list(page)
+        while page.next_cursor:
+            page = paginator.get_page(page.next_cursor)
+            collected.extend(page)
+        self.assertEqual(collected, self.expected)
+        self.assertEqual(len(page), 5)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Курсор назад возвращает предыдущую страницу"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page(None)
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(first.previous_cursor, '')
+        back = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_page_does_not_count(self):
+        """Курсорная страница не выполняет COUNT(*)"""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = str(paginator.get_page(None).next_cursor)
+        with self.assertNumQueries(1):
+            list(paginator.get_page(cursor))
+
+    def test_broken_cursor_returns_first_page(self):
+        """Поврежденный курсор отдает первую страницу"""
+        self.assertEqual(decode_cursor('не курсор'), (None, None))
+        page = CursorPaginator(Post.objects.all(), 10).get_page('bnVsbA')
+        self.assertEqual(list(page), self.expected[:10])
+
+    def test_forged_cursor_returns_first_page(self):
+        """Токен с ключом чужих типов не роняет ленты"""
+        tokens = [encode_cursor('n', values) for values in (
+            [1, 2], [{'a': 1}, 2], ['не дата', 2], [None, 2],
+            ['2023-01-01T00:00:00', True], ['2023-13-45T00:00:00', 1])]
+        for token in tokens:
+            with self.subTest(token=token):
+                self.assertEqual(decode_cursor(token), (None, None))
+                response = self.client.get(INDEX, {'cursor': token})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    list(response.context['page_obj']), self.expected[:10])
+
+    def test_cached_fragment_skips_feed_query(self):
+        """При попадании в кэш фрагмента посты ленты не читаются"""
+        client = Client()
+        client.force_login(self.author)
+        urls = (
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                client.get(url)
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse([
+                    query['sql'] for query in context.captured_queries
+                    if 'FROM "posts_post"' in query['sql']])
+
+    def test_views_paginate_by_cursor(self):
+        """Ленты листаются по курсору"""
+        urls = (
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                cursor = response.context['page_obj'].next_cursor
+                response = self.guest_client.get(f'{url}?cursor={cursor}')
+                self.assertEqual(list(response.context['page_obj']),
+                                 self.expected[10:20])
+
+    def test_modes_do_not_share_fragments(self):
+        """Первая страница по номеру и по курсору кэшируются раздельно"""
+        urls = (
+            INDEX,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url, {'page': 1}), '?page=2')
+                response = self.guest_client.get(url)
+                self.assertContains(response, '?cursor=')
+                self.assertNotContains(response, '?page=2')
+
+
+class WindowedPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        Post.objects.bulk_create(Post(
+            text=settings.POST_TEXT,
+            author=cls.author,
+        ) for _ in range(POSTS_COUNT))
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(PAGINATOR_WINDOW=2)
+    def test_page_window(self):
+        """Ссылки строятся только на страницы рядом с текущей"""
+        paginator = WindowedPaginator(Post.objects.all(), 1)
+        self.assertEqual(list(paginator.get_page(1).window), [1, 2, 3])
+        self.assertEqual(list(paginator.get_page(10).window),
+                         [8, 9, 10, 11, 12])
+        self.assertEqual(list(paginator.get_page(POSTS_COUNT).window),
+                         [23, 24, 25])
+
+    def test_count_is_cached_per_scope(self):
+        """Число постов кэшируется и сбрасывается при создании поста"""
+        self.assertEqual(
+            WindowedPaginator(Post.objects.all(), 10, scope='feed').count,
+            POSTS_COUNT)
+        with self.assertNumQueries(0):
+            WindowedPaginator(Post.objects.all(), 10, scope='feed').count
+        Post.objects.create(text=settings.POST_TEXT, author=self.author)
+        self.assertEqual(
+            WindowedPaginator(Post.objects.all(), 10, scope='feed').count,
+            POSTS_COUNT + 1)
+
+    @override_settings(PAGINATOR_EXACT_COUNT_LIMIT=10)
+    def test_estimate_above_limit(self):
+        """Большие выборки не считаются точным COUNT(*)"""
+        paginator = WindowedPaginator(
+            Post.objects.all(), 10, estimate=lambda: 1000)
+        with self.assertNumQueries(0):
+            self.assertEqual(paginator.num_pages, 100)
+
+    def test_views_use_page_number(self):
+        """Номер страницы в адресе по-прежнему работает"""
+        response = Client().get(
+            reverse('posts:profile',
+                    kwargs={'username': self.author.username}) + '?page=3')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 5)
+        self.assertEqual(list(page_obj.window), [1, 2, 3])
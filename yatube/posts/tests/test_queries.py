@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страниц не зависит от количества постов на них"""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title=settings.GROUP_TITLE,
+            slug=settings.SLUG,
+            description=settings.DESCRIPTION
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for _ in range(settings.POST_LIMIT + 5):
+            cls.post = Post.objects.create(
+                text=settings.POST_TEXT,
+                author=cls.author,
+                group=cls.group,
+            )
+        for _ in range(settings.POSTS_ON_PAGE):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_guest_query_budget(self):
+        """Бюджет запросов для гостя
+
+        Первый запрос рендерит страницу, повторный берет ее из кэша
+        страниц, выполняя только поиск областей версий.
+        """
+        budgets = {
+            reverse('posts:index'): (1, 0),
+            reverse('posts:group_list', kwargs={'slug': settings.SLUG}): (
+                3, 1),
+            reverse('posts:profile',
+                    kwargs={'username': settings.USER_NAME}): (3, 1),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): (
+                3, 1),
+        }
+        for url, (budget, cached) in budgets.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    self.guest_client.get(url)
+                with self.assertNumQueries(cached):
+                    self.guest_client.get(url)
+
+    def test_authorized_query_budget(self):
+        """Бюджет запросов для авторизованного пользователя
+
+        Сессия и пользователь добавляют по два запроса к каждой странице.
+        """
+        budgets = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': settings.SLUG}): 4,
+            reverse('posts:profile',
+                    kwargs={'username': settings.USER_NAME}): 5,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 4,
+            reverse('posts:follow_index'): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url), self.assertNumQueries(budget):
+                self.authorized_client.get(url)
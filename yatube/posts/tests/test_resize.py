@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.test import Client, TestCase, override_settings
+from PIL import Image
+
+from .. import resize
+from ..models import Post, User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_RESIZE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def picture(size=(400, 200)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'blue').save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name='picture.jpg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   RESIZE_CACHE_DIR=TEMP_RESIZE_DIR)
+class ResizeEndpointTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create(username=settings.USER_NAME)
+        cls.post = Post.objects.create(
+            text='Пост', author=author, image=picture())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_RESIZE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def test_signed_url_is_resized_and_cached(self):
+        """Подписанная ссылка отдает уменьшенную копию на год"""
+        url = resize.resize_url(self.post.image.name, '100x100')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (100, 50))
+        self.assertEqual(len(os.listdir(TEMP_RESIZE_DIR)), 1)
+
+    def test_bad_requests_are_rejected(self):
+        """Чужая подпись и слишком большие размеры отклоняются"""
+        name = self.post.image.name
+        url = resize.resize_url(name, '100x100')
+        cases = {
+            url.replace('100x100', '101x100'): 403,
+            resize.resize_url(name, '5000x5000'): 404,
+            resize.resize_url('posts/missing.jpg', '100x100'): 404,
+        }
+        for url, status in cases.items():
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.guest_client.get(url).status_code, status)
+
+    def test_cache_is_pruned_by_age(self):
+        """Дисковый кэш вытесняет давно не читанные файлы"""
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for index, name in enumerate(('old', 'recent', 'new')):
+            path = os.path.join(directory, name)
+            with open(path, 'wb') as file:
+                file.write(b'x' * 10)
+            os.utime(path, (index, index))
+        resize.prune(directory, 20, keep=os.path.join(directory, 'new'))
+        self.assertEqual(sorted(os.listdir(directory)), ['new', 'recent'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   RESIZE_CACHE_DIR=TEMP_RESIZE_DIR, RESIZE_TIMEOUT=0.01)
+class ResizePoolTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create(username=settings.USER_NAME)
+        cls.post = Post.objects.create(
+            text='Пост', author=author, image=picture((300, 300)))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.slots = threading.BoundedSemaphore(1)
+        self.future = Future()
+        self.pool = Mock(submit=Mock(return_value=self.future))
+        for name, value in (('_slots', self.slots),
+                            ('executor', Mock(return_value=self.pool))):
+            patcher = patch.object(resize, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, geometry='30x30'):
+        return self.client.get(
+            resize.resize_url(self.post.image.name, geometry))
+
+    def test_slot_is_held_until_job_finishes(self):
+        """Не дождавшийся запрос не освобождает место в очереди"""
+        self.assertEqual(self.get().status_code, 503)
+        self.assertEqual(self.get('31x31').status_code, 503)
+        self.pool.submit.assert_called_once()
+        self.future.set_result(None)
+        self.assertTrue(self.slots.acquire(blocking=False))
+
+    def test_pool_errors_are_mapped(self):
+        """Упавший пул - 503, слишком большая картинка - 400"""
+        for error, status in ((BrokenProcessPool(), 503),
+                              (Image.DecompressionBombError(), 400)):
+            with self.subTest(error=error):
+                self.future = Future()
+                self.pool.submit.return_value = self.future
+                self.future.set_exception(error)
+                self.assertEqual(self.get().status_code, status)
@@ -0,0 +1,108 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post, PostTerm, User
+from ..paginators import WindowedPaginator
+from ..search import search, stem, tokenize
+
+SEARCH = reverse('posts:search')
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        """Формы одного слова сводятся к одной основе"""
+        for forms in (('книга', 'книги', 'книгами'),
+                      ('поиск', 'поиска', 'поисков'),
+                      ('красивая', 'красивый', 'красивые')):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_tokenize(self):
+        """Стоп-слова и одиночные символы отбрасываются, ё заменяется"""
+        self.assertEqual(
+            tokenize('Я читаю ёлки и книги о Python 3'),
+            [stem('читаю'), 'елк', 'книг', 'python'],
+        )
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+        cls.other = User.objects.create(username='other')
+        cls.group = Group.objects.create(
+            title=settings.GROUP_TITLE,
+            slug=settings.SLUG,
+            description=settings.DESCRIPTION,
+        )
+        cls.rare = Post.objects.create(
+            text='Редкие книги и редкая книга', author=cls.author,
+            group=cls.group)
+        cls.once = Post.objects.create(
+            text='Одна книга про котов', author=cls.other)
+        cls.cats = Post.objects.create(
+            text='Коты и кошки', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ranking(self):
+        """Пост с большим числом совпадений выше в выдаче"""
+        found = list(search('книги').order_by('-rank', '-pk'))
+        self.assertEqual(found, [self.rare, self.once])
+        found = list(search('редкая книга').order_by('-rank', '-pk'))
+        self.assertEqual(found[0], self.rare)
+
+    def test_filters(self):
+        """Выдача фильтруется по группе и автору"""
+        self.assertEqual(
+            list(search('книга', group=self.group)), [self.rare])
+        self.assertEqual(
+            list(search('книга', author=self.other)), [self.once])
+
+    def test_index_follows_changes(self):
+        """Правка и удаление поста обновляют индекс"""
+        post = Post.objects.get(pk=self.cats.pk)
+        post.text = 'Собаки'
+        post.save()
+        self.assertFalse(search('коты').filter(pk=post.pk).exists())
+        self.assertTrue(search('собака').filter(pk=post.pk).exists())
+        pk = post.pk
+        post.delete()
+        self.assertFalse(PostTerm.objects.filter(post_id=pk).exists())
+
+    def test_numbered_pages(self):
+        """Страницы выдачи идут без пропусков и повторов"""
+        Post.objects.bulk_create(
+            Post(text='книга ' * (i % 3 + 1), author=self.author)
+            for i in range(5))
+        for post in Post.objects.filter(text__startswith='книга'):
+            post.save()
+        expected = list(search('книга'))
+        paginator = WindowedPaginator(search('книга'), 3)
+        found = []
+        for number in paginator.page_range:
+            found.extend(paginator.page(number))
+        self.assertEqual(found, expected)
+
+    def test_search_page(self):
+        """Страница поиска выводит найденное и сохраняет запрос в ссылках"""
+        Post.objects.bulk_create(
+            Post(text=f'Книга {i}', author=self.author)
+            for i in range(settings.POSTS_ON_PAGE))
+        for post in Post.objects.filter(text__startswith='Книга '):
+            post.save()
+        response = self.client.get(SEARCH, {'q': 'книга'})
+        self.assertEqual(
+            len(response.context['page_obj']), settings.POSTS_ON_PAGE)
+        self.assertContains(response, '?q=%D0%BA%D0%BD%D0%B8%D0%B3%D0%B0&amp;'
+                                      'page=2')
+        response = self.client.get(SEARCH, {'q': 'кошка'})
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            [self.cats.pk])
+        response = self.client.get(SEARCH, {'q': 'книга', 'author': 'nobody'})
+        self.assertIsNone(response.context['page_obj'])
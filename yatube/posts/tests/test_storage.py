@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..models import Post, User
+from ..versions import cache_version
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = b'GIF89a-content'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@patch('posts.thumbnails.transaction.on_commit', lambda func: func())
+@patch('posts.thumbnails.schedule')
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_post(self, name='meme.gif', content=CONTENT):
+        post = Post(text='Пост', author=self.author)
+        post.image.save(name, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_identical_uploads_share_file(self, schedule):
+        """Одинаковые загрузки ссылаются на один файл"""
+        first = self.create_post()
+        second = self.create_post('copy.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^posts/\w{2}/\w{64}\.gif$')
+        self.assertNotEqual(
+            self.create_post(content=b'other').image.name, first.image.name)
+
+    def test_file_is_deleted_with_last_reference(self, schedule):
+        """Файл удаляется вместе с последним ссылающимся постом"""
+        first = self.create_post()
+        second = self.create_post()
+        storage = first.image.storage
+        first.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        second.image = ContentFile(b'new', name='new.gif')
+        second.save()
+        self.assertFalse(storage.exists(first.image.name))
+
+    def test_dedupe_media_command(self, schedule):
+        """Команда переносит старые файлы по хэшу и убирает дубликаты"""
+        plain = FileSystemStorage()
+        names = [plain.save(f'posts/{name}', ContentFile(CONTENT))
+                 for name in ('a.gif', 'b.gif')]
+        for name in names:
+            post = Post.objects.create(text='Пост', author=self.author)
+            Post.objects.filter(pk=post.pk).update(image=name)
+        versions = cache_version('feed', f'author:{self.author.pk}')
+        call_command('dedupe_media', stdout=StringIO())
+        self.assertNotEqual(
+            cache_version('feed', f'author:{self.author.pk}'), versions)
+        images = set(Post.objects.values_list('image', flat=True))
+        self.assertEqual(len(images), 1)
+        self.assertTrue(plain.exists(images.pop()))
+        for name in names:
+            self.assertFalse(plain.exists(name))
+
+    def test_file_removed_before_commit_is_restored(self, schedule):
+        """Файл, удаленный очисткой до фиксации поста, записывается
+        снова"""
+        storage = Post._meta.get_field('image').storage
+        first = self.create_post()
+        callbacks = []
+        with patch('posts.storage.transaction.on_commit', callbacks.append):
+            second = self.create_post('copy.gif')
+        storage.delete(first.image.name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(storage.exists(second.image.name))
+        with storage.open(second.image.name) as file:
+            self.assertEqual(file.read(), CONTENT)
+        directory = os.path.dirname(storage.path(second.image.name))
+        self.assertEqual(os.listdir(directory),
+                         [os.path.basename(second.image.name)])
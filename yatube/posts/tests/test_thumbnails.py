@@ -0,0 +1,181 @@
+import json
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+
+from .. import thumbnails
+from ..models import Post, User
+from ..templatetags.post_images import post_image
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def render_image(post, **options):
+    return render_to_string(
+        'posts/includes/picture.html', post_image(post, **options))
+
+
+def fake(name, geometry, **options):
+    width, height = geometry.split('x')
+    return Mock(url=f'/{width}.{options["format"]}',
+                width=int(width), height=int(height))
+
+
+def fake_many(requests):
+    return [fake(name, geometry, **options)
+            for name, geometry, options in requests]
+
+
+def image(name='small.gif', content=SMALL_GIF):
+    return SimpleUploadedFile(
+        name=name, content=content, content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=settings.USER_NAME)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        thumbnails._pending.clear()
+
+    def test_original_is_shown_until_generated(self):
+        """Пока миниатюр нет, выводится оригинал и генерация ставится
+        в очередь, а готовые миниатюры выводятся через <picture>"""
+        with patch.object(thumbnails, 'schedule') as schedule:
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=image())
+            html = render_image(post, lazy=True)
+        schedule.assert_called_with(post)
+        self.assertIn(f'src="{post.image.url}"', html)
+        self.assertIn('loading="lazy"', html)
+
+        post = Post.objects.get(pk=post.pk)
+        with patch.object(thumbnails.backend, 'lookup_many',
+                          side_effect=fake_many):
+            html = render_image(post)
+        self.assertIn(
+            'srcset="/480.WEBP 480w, /960.WEBP 960w, /1440.WEBP 1440w"', html)
+        self.assertIn('src="/960.JPEG"', html)
+        self.assertIn('width="960" height="339"', html)
+        self.assertNotIn('loading="lazy"', html)
+
+    def test_generate_makes_all_variants(self):
+        """Генерация создает все варианты и сдвигает версии страниц"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=image())
+        thumbnails._pending.add(post.image.name)
+        with patch.object(thumbnails.backend, 'get_thumbnail',
+                          side_effect=fake) as create, \
+                patch.object(thumbnails, 'bump') as bump:
+            thumbnails.generate(post.image.name, ['feed'])
+        self.assertEqual(
+            [call.args[1:] for call in create.call_args_list],
+            [('480x170',), ('960x339',), ('1440x508',)] * 2,
+        )
+        self.assertEqual(
+            [call.kwargs['format'] for call in create.call_args_list],
+            ['WEBP'] * 3 + ['JPEG'] * 3,
+        )
+        bump.assert_called_once_with('feed')
+        self.assertNotIn(post.image.name, thumbnails._pending)
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(
+            thumbnails.stored_picture(post, 'card')['src'], '/960.JPEG')
+
+    def test_stored_picture_skips_lookups(self):
+        """Сохраненная в посте разметка строится без обращений к sorl"""
+        post = Post.objects.create(
+            text='Пост', author=self.author, image=image())
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        Post.objects.filter(pk=post.pk).update(thumbnails=json.dumps(
+            {'card': {'sources': [], 'srcset': '', 'src': '/stored.jpg',
+                      'width': 960, 'height': 339}}))
+        post.refresh_from_db()
+        with patch.object(thumbnails.backend, 'lookup_many') as lookup:
+            html = render_image(post)
+        lookup.assert_not_called()
+        self.assertIn('src="/stored.jpg"', html)
+
+    def test_page_is_resolved_in_one_batch(self):
+        """Миниатюры страницы ищутся одним get_many и одним запросом"""
+        posts = [Post.objects.create(
+            text='Пост', author=self.author,
+            image=image(f'{index}.gif', SMALL_GIF + bytes([index])))
+            for index in range(3)]
+        with patch.object(thumbnails, 'schedule') as schedule:
+            with self.assertNumQueries(1):
+                thumbnails.attach_pictures(posts)
+            self.assertEqual(schedule.call_count, len(posts))
+            with self.assertNumQueries(0):
+                thumbnails.attach_pictures(
+                    [Post(pk=post.pk, image=post.image.name)
+                     for post in posts])
+        for post in posts:
+            self.assertIsNone(post.pictures['card'])
+
+    def test_generation_is_scheduled_on_image_change(self):
+        """Генерация запускается только при смене картинки"""
+        with patch.object(thumbnails, 'schedule') as schedule:
+            post = Post.objects.create(
+                text='Пост', author=self.author, image=image())
+            post.text = 'Правка'
+            post.save()
+            self.assertEqual(schedule.call_count, 1)
+            post.image = image('other.gif', SMALL_GIF + b'\x00')
+            post.save()
+            self.assertEqual(schedule.call_count, 2)
+
+    def test_generation_waits_for_commit(self):
+        """Задача уходит в пул только после фиксации транзакции"""
+        post = Post(text='Пост', author=self.author, image='posts/x.gif')
+        callbacks = []
+        with patch.object(thumbnails, 'executor') as executor, \
+                patch.object(thumbnails.transaction, 'on_commit',
+                             callbacks.append):
+            thumbnails.schedule(post)
+            thumbnails.schedule(post)
+            executor.assert_not_called()
+            self.assertEqual(thumbnails._pending, set())
+            for callback in callbacks:
+                callback()
+        executor().submit.assert_called_once()
+        self.assertEqual(thumbnails._pending, {'posts/x.gif'})
+
+    def test_rollback_does_not_block_generation(self):
+        """После отката транзакции генерация ставится снова"""
+        post = Post(text='Пост', author=self.author, image='posts/x.gif')
+        with patch.object(thumbnails, 'executor') as executor:
+            # Обратные вызовы отмененной транзакции не выполняются
+            with patch.object(thumbnails.transaction, 'on_commit'):
+                thumbnails.schedule(post)
+            callbacks = []
+            with patch.object(thumbnails.transaction, 'on_commit',
+                              callbacks.append):
+                thumbnails.schedule(post)
+            self.assertEqual(len(callbacks), 1)
+            callbacks[0]()
+        executor().submit.assert_called_once()
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -39,6 +40,9 @@ class PostsPagesTests(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        # Картинки хранятся по хэшу содержимого
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest}.gif'
         cls.author = User.objects.create(username=settings.USER_NAME)
         cls.user = User.objects.create(username='TestUser')
         cls.group = Group.objects.create(
@@ -97,7 +101,7 @@ class PostsPagesTests(TestCase):
         self.assertEqual(first_object.text, self.post.text)
         self.assertEqual(first_object.group.title, self.group.title)
         post_image = Post.objects.first().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.image_name)
 
     def test_group_list_show_correct_context(self):
         """Проверка контекста posts:group_list"""
@@ -105,7 +109,7 @@ class PostsPagesTests(TestCase):
         expected = list(Post.objects.filter(group=self.group.pk))
         self.assertEqual(list(response.context.get('page_obj')), expected)
         post_image = Post.objects.first().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.image_name)
 
     def test_profile_show_correct_context(self):
         """Проверка контекста posts:profile"""
@@ -113,7 +117,7 @@ class PostsPagesTests(TestCase):
         expected = list(Post.objects.filter(author=self.author))
         self.assertEqual(list(response.context.get('page_obj')), expected)
         post_image = Post.objects.first().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.image_name)
 
     def test_post_detail_show_correct_context(self):
         """Проверка контекста posts:post_detail"""
@@ -121,7 +125,7 @@ class PostsPagesTests(TestCase):
         post_odj = response.context.get('post')
         self.assertEqual(post_odj, self.post)
         post_image = Post.objects.first().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.image_name)
 
     form_fields = {
         'text': forms.fields.CharField,
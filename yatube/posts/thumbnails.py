@@ -0,0 +1,294 @@
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.kvstores.cached_db_kvstore import \
+    KVStore as CachedDBKVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from .models import Post
+from .versions import bump, post_scopes
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+class PregeneratedBackend(ThumbnailBackend):
+    def _thumbnail(self, file_, geometry_string, options):
+        # Разбор параметров как в get_thumbnail, без открытия картинки
+        source = ImageFile(file_)
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup_many(self, requests):
+        """Готовые миниатюры для списка (файл, геометрия, параметры).
+
+        Для хранилища ключей в кэше и базе это один get_many к кэшу
+        и один запрос к базе на все промахи; отсутствующие миниатюры
+        возвращаются как None.
+        """
+        keys = [add_prefix(self._thumbnail(*request).key)
+                for request in requests]
+        kvstore = default.kvstore
+        if isinstance(kvstore, CachedDBKVStore):
+            values = self._get_many_raw(kvstore, keys)
+        else:
+            values = {key: kvstore._get_raw(key) for key in keys}
+        return [deserialize_image_file(values[key]) if values.get(key)
+                else None for key in keys]
+
+    @staticmethod
+    def _get_many_raw(kvstore, keys):
+        values = kvstore.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            # Как и sorl, запоминаем промахи, чтобы не ходить в базу снова
+            found.update((key, EMPTY_VALUE) for key in missing
+                         if key not in found)
+            kvstore.cache.set_many(
+                found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        return {key: value for key, value in values.items()
+                if value != EMPTY_VALUE}
+
+
+backend = PregeneratedBackend()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def generate(name, scopes=()):
+    """Создает все варианты миниатюр из POST_THUMBNAILS и сохраняет
+    размеры картинки и разметку миниатюр во всех постах с этим файлом.
+
+    Затем сдвигает версии страниц, на которых до этого выводился
+    оригинал.
+    """
+    try:
+        if not default.storage.exists(name):
+            return
+        pictures = {}
+        for size in settings.POST_THUMBNAILS:
+            found = {}
+            for image_format, width, geometry, options in variants(size):
+                thumbnail = backend.get_thumbnail(name, geometry, **options)
+                found.setdefault(image_format, []).append((width, thumbnail))
+            pictures[size] = _picture(found, size)
+        with default.storage.open(name) as source:
+            image_width, image_height = get_image_dimensions(source)
+        Post.objects.filter(image=name).update(
+            image_width=image_width,
+            image_height=image_height,
+            thumbnails=json.dumps(pictures),
+        )
+        bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        _pending.discard(name)
+        connection.close()
+
+
+def image_changed(post):
+    """Сбрасывает сохраненные миниатюры и запоминает размеры новой
+    картинки, пока загрузка еще не записана в хранилище."""
+    post.thumbnails = ''
+    post.image_width = post.image_height = None
+    if post.image and not post.image._committed:
+        post.image_width, post.image_height = get_image_dimensions(
+            post.image.file)
+
+
+def _submit(name, scopes):
+    # Картинка отмечается ожидающей только после фиксации: при откате
+    # транзакции обратный вызов не выполняется и отметка не остается
+    with _executor_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    try:
+        executor().submit(generate, name, scopes)
+    except Exception:
+        _pending.discard(name)
+        raise
+
+
+def schedule(post):
+    """Ставит генерацию миниатюр поста в пул после фиксации транзакции."""
+    name = post.image.name
+    if not name or name in _pending:
+        return
+    scopes = post_scopes(post)
+    transaction.on_commit(lambda: _submit(name, scopes))
+
+
+def release(name):
+    """Удаляет файл картинки и его миниатюры, если после фиксации
+    транзакции на него не ссылается ни один пост.
+
+    Файлы хранятся по хэшу содержимого, поэтому один файл может
+    принадлежать многим постам.
+    """
+    if not name:
+        return
+
+    def cleanup():
+        if Post.objects.filter(image=name).exists():
+            return
+        try:
+            backend.delete(name)
+        except Exception:
+            logger.exception('Не удалось удалить картинку %s', name)
+
+    transaction.on_commit(cleanup)
+
+
+def _base_geometry(size):
+    geometry, options = settings.POST_THUMBNAILS[size]
+    width, height = (int(value) for value in geometry.split('x'))
+    return width, height, options
+
+
+def variants(size):
+    """Варианты миниатюры ``size`` по форматам и ширинам.
+
+    Возвращает кортежи (формат, ширина, геометрия, параметры sorl);
+    высота считается из пропорций базовой геометрии POST_THUMBNAILS.
+    """
+    width, height, options = _base_geometry(size)
+    for image_format in settings.POST_IMAGE_FORMATS:
+        for variant_width in settings.POST_IMAGE_WIDTHS:
+            variant_height = round(height * variant_width / width)
+            yield (
+                image_format,
+                variant_width,
+                f'{variant_width}x{variant_height}',
+                dict(options, format=image_format),
+            )
+
+
+def _picture(found, size):
+    """Данные для разметки <picture> из миниатюр ``found``, сгруппированных
+    по форматам в порядке POST_IMAGE_FORMATS: последний формат служит
+    запасным для <img>."""
+    sources = [
+        {
+            'type': MIME_TYPES[image_format],
+            'srcset': ', '.join(f'{thumbnail.url} {width}w'
+                                for width, thumbnail in thumbnails),
+        }
+        for image_format, thumbnails in found.items()
+    ]
+    # Размеры <img> берутся у запасной миниатюры базовой ширины
+    fallback = dict(found[settings.POST_IMAGE_FORMATS[-1]])
+    base = fallback.get(_base_geometry(size)[0])
+    if base is None:
+        base = fallback[max(fallback)]
+    return {
+        'sources': sources[:-1],
+        'srcset': sources[-1]['srcset'],
+        'src': base.url,
+        'width': base.width,
+        'height': base.height,
+    }
+
+
+def stored_picture(post, size):
+    """Разметка миниатюр, сохраненная в посте при генерации, или None."""
+    if not post.thumbnails:
+        return None
+    return json.loads(post.thumbnails).get(size)
+
+
+def attach_pictures(posts, size='card'):
+    """Добавляет постам с картинками ``post.pictures[size]`` - данные
+    для разметки <picture> или None, пока миниатюры не готовы.
+
+    Разметка берется из самих постов, а для постов без нее миниатюры
+    всей страницы ищутся одним пакетом в хранилище ключей sorl. Для
+    картинок, у которых каких-то вариантов нет, генерация ставится
+    в очередь, так что посты, загруженные до появления пула, догоняются
+    при первом показе.
+    """
+    pending = _attach_stored(posts, size)
+    if pending:
+        _attach_found(pending, size)
+    return posts
+
+
+def _attach_stored(posts, size):
+    """Разметка из самих постов; возвращает посты, у которых ее нет."""
+    pending = []
+    for post in posts:
+        if not hasattr(post, 'pictures'):
+            post.pictures = {}
+        if post.image:
+            post.pictures[size] = stored_picture(post, size)
+            if post.pictures[size] is None:
+                pending.append(post)
+    return pending
+
+
+def _attach_found(pending, size):
+    """Ищет миниатюры постов одним пакетом и ставит в очередь
+    генерацию недостающих."""
+    sizes = list(variants(size))
+    try:
+        # Ключ миниатюры зависит от хранилища: как и generate(),
+        # ищем по имени файла в хранилище sorl
+        found = iter(backend.lookup_many([
+            (post.image.name, geometry, options)
+            for post in pending
+            for _, _, geometry, options in sizes
+        ]))
+    except Exception:
+        logger.exception('Не удалось найти миниатюры страницы')
+        return
+    for post in pending:
+        thumbnails = {}
+        for (image_format, width, _, _), thumbnail in zip(sizes, found):
+            thumbnails.setdefault(image_format, []).append((width, thumbnail))
+        if any(thumbnail is None for variant in thumbnails.values()
+               for _, thumbnail in variant):
+            schedule(post)
+        else:
+            post.pictures[size] = _picture(thumbnails, size)
+
+
+def post_picture(post, size):
+    """Данные для разметки <picture> одного поста, см. attach_pictures."""
+    pictures = getattr(post, 'pictures', {})
+    if size not in pictures:
+        attach_pictures([post], size)
+    return post.pictures.get(size)
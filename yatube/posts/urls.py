@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -11,14 +12,23 @@ urlpatterns = [
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
+    path('search/', views.search_posts, name='search'),
+    path('autocomplete/', views.autocomplete_names, name='autocomplete'),
     path('follow/', views.follow_index, name='follow_index'),
     path('profile/<str:username>/follow/',
          views.profile_follow,
          name='profile_follow'),
     path('profile/<str:username>/unfollow/',
          views.profile_unfollow,
-         name='profile_unfollow')
+         name='profile_unfollow'),
+    path(f'{settings.MEDIA_URL.strip("/")}/resize/<str:signature>/'
+         '<str:geometry>/<path:path>',
+         views.resize_image,
+         name='resize_image'),
 ]
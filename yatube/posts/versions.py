@@ -0,0 +1,138 @@
+import math
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+VERSION_KEY = 'version:{}'
+MODIFIED_KEY = 'modified:{}'
+
+
+def _initial():
+    # Счетчик, потерянный кэшем, начинается с нового значения, поэтому
+    # не совпадает со старыми версиями уже закэшированных фрагментов.
+    return int(time.time() * 1000)
+
+
+def scope_versions(*scopes):
+    """Текущие версии областей кэша одним обращением к кэшу."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _initial() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def last_modified(*scopes):
+    """Время последнего изменения областей.
+
+    Отметка, которой нет в кэше (область не менялась с его запуска или
+    вытеснена), начинается с текущего времени, как и версии: раньше
+    настоящего изменения она не бывает, поэтому 304 не отдаст
+    устаревшую страницу.
+    """
+    keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    stamps = cache.get_many(keys)
+    now = time.time()
+    missing = {key: now for key in keys if key not in stamps}
+    if missing:
+        cache.set_many(missing, None)
+        stamps.update(missing)
+    return max(stamps.values())
+
+
+def cache_version(*scopes):
+    """Часть ключа кэша фрагмента, меняющаяся вместе с областями."""
+    return '.'.join(str(version) for version in scope_versions(*scopes))
+
+
+def _bump(scopes):
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial(), None)
+    now = time.time()
+    cache.set_many(
+        {MODIFIED_KEY.format(scope): now for scope in scopes}, None)
+
+
+def bump(*scopes):
+    """Сдвигает версии областей: все их фрагменты становятся устаревшими.
+
+    Внутри транзакции версии сдвигаются еще раз после ее фиксации:
+    иначе параллельный запрос успеет закэшировать под новой версией
+    старые строки.
+    """
+    scopes = set(scopes)
+    _bump(scopes)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def post_scopes(post, group_id=None):
+    scopes = ['feed', f'author:{post.author_id}', f'post:{post.pk}']
+    for pk in {post.group_id, group_id} - {None}:
+        scopes.append(f'group:{pk}')
+    return scopes
+
+
+FRAGMENT_STATS = Counter()
+
+
+def _expires_early(entry, now):
+    """Вероятностное раннее истечение (XFetch): чем дольше пересчет
+    и ближе срок, тем вероятнее пересчитать запись заранее."""
+    jitter = -entry['delta'] * settings.FRAGMENT_EARLY_BETA * math.log(
+        1.0 - random.random())
+    return now + jitter >= entry['expires']
+
+
+def get_or_compute(key, version, compute, timeout):
+    """Кэш с защитой от лавины пересчетов.
+
+    Свежая запись текущей версии отдается как есть. Пересчитывает только
+    запрос, захвативший блокировку, остальные тем временем получают
+    устаревшую запись (stale-while-revalidate), а если ее нет - ждут
+    результат не дольше FRAGMENT_WAIT_TIMEOUT и считают сами.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    current = entry is not None and entry['version'] == version
+    if current:
+        if not _expires_early(entry, now):
+            FRAGMENT_STATS['fresh'] += 1
+            return entry['value']
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, settings.FRAGMENT_LOCK_TIMEOUT):
+        try:
+            value = compute()
+            finished = time.time()
+            cache.set(key, {
+                'value': value,
+                'version': version,
+                'expires': finished + timeout,
+                'delta': finished - now,
+            }, timeout + settings.FRAGMENT_STALE_TIMEOUT)
+        finally:
+            cache.delete(lock)
+        FRAGMENT_STATS['early' if current else 'recomputed'] += 1
+        return value
+    if entry is not None:
+        FRAGMENT_STATS['stale'] += 1
+        return entry['value']
+    deadline = now + settings.FRAGMENT_WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            FRAGMENT_STATS['waited'] += 1
+            return entry['value']
+    FRAGMENT_STATS['timeout'] += 1
+    return compute()
@@ -1,72 +1,171 @@
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
 
-from .models import Follow, Group, Post, User
-from .forms import CommentForm, PostForm
+from . import autocomplete
+from .models import Comment, Follow, Group, Post, TimelineEntry, User
+from .feeds import TimelinePaginator, followed_pull_authors
+from .forms import CommentForm, PostForm, SearchForm
+from .page_cache import cache_anonymous_page
+from .resize import parse_geometry, serve
+from .search import search
+from .paginators import (CommentPaginator, CursorPaginator,
+                         WindowedPaginator, pk_range_estimate)
+from .versions import cache_version
 
 
-def paginator_object(request, post_list):
-    paginator = Paginator(post_list, settings.POSTS_ON_PAGE)
+def paginator_page(
+        queryset,
+        request,
+        posts_on_page=settings.POST_LIMIT,
+        **kwargs
+):
+    # Номер страницы оставлен для старых ссылок, по умолчанию - курсор
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if page_number is not None:
+        return WindowedPaginator(
+            queryset, posts_on_page, **kwargs).get_page(page_number)
+    return CursorPaginator(queryset, posts_on_page).get_page(
+        request.GET.get('cursor'))
+
+
+def paginator_object(request, post_list, **kwargs):
+    return paginator_page(
+        post_list, request, settings.POSTS_ON_PAGE, **kwargs)
+
+
+def index_scopes():
+    return ['feed']
+
+
+def group_scopes(slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    return None if pk is None else [f'group:{pk}']
+
 
+def profile_scopes(username):
+    pk = User.objects.filter(
+        username=username).values_list('pk', flat=True).first()
+    return None if pk is None else [f'author:{pk}']
 
+
+def post_scopes(post_id):
+    # Счетчик постов автора и описание группы на странице меняются
+    # вместе с областями автора и группы
+    row = Post.objects.filter(
+        pk=post_id).values_list('author_id', 'group_id').first()
+    if row is None:
+        return None
+    author_id, group_id = row
+    scopes = [f'post:{post_id}', f'author:{author_id}']
+    if group_id is not None:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+@cache_anonymous_page(index_scopes)
 def index(request):
     title = 'Последние обновления на сайте'
-    post_list = Post.objects.all()
-    page_obj = paginator_object(request, post_list)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = paginator_object(
+        request,
+        post_list,
+        scope='feed',
+        estimate=lambda: pk_range_estimate(Post.objects.all()),
+    )
     context = {
         'title': title,
         'page_obj': page_obj,
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': cache_version('feed'),
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     title = f'Записи группы {group.title}'
-    post_list = group.posts.all()
-    page_obj = paginator_object(request, post_list)
+    post_list = group.posts.select_related('author')
+    page_obj = paginator_object(
+        request,
+        post_list,
+        scope=f'group:{group.pk}',
+        estimate=lambda: group.post_count,
+    )
     description = group.description
     context = {
         'group': group,
         'title': title,
         'page_obj': page_obj,
-        'description': description
+        'description': description,
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': cache_version(f'group:{group.pk}'),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_page(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
-    page_obj = paginator_object(request, post_list)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    post_list = author.posts.select_related('group')
+    page_obj = paginator_object(
+        request,
+        post_list,
+        scope=f'author:{author.pk}',
+        estimate=lambda: author.stats.post_count,
+    )
     following = (request.user.is_authenticated
-                 and author.following.filter(user=request.user,))
+                 and author.following.filter(user=request.user).exists())
     context = {
         'page_obj': page_obj,
         'author': author,
         'following': following,
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': cache_version(f'author:{author.pk}'),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_anonymous_page(post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     title = post.text[0:30]
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    # Первая страница комментариев, следующие подгружаются фрагментами
+    comments = CommentPaginator(
+        post.comments.select_related('author'),
+        settings.COMMENTS_ON_PAGE,
+    ).get_page(None)
     context = {
         'post': post,
         'title': title,
         'form': form,
-        'comments': comments
+        'comments': comments,
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': cache_version(f'post:{post.pk}'),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_anonymous_page(post_scopes)
+def post_comments(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    comments = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_ON_PAGE,
+    ).get_page(request.GET.get('cursor'))
+    context = {
+        'post_id': post_id,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None,
@@ -114,22 +213,57 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
-def paginator_page(
-        queryset,
-        request,
-        posts_on_page=settings.POST_LIMIT,
-):
-    return Paginator(queryset, posts_on_page).get_page(
-        request.GET.get('page'))
-
-
 @login_required
 def follow_index(request):
-    post = Post.objects.filter(author__following__user=request.user)
-    context = {'page_obj': paginator_page(post, request)}
+    entries = TimelineEntry.objects.filter(user=request.user)
+    page_obj = TimelinePaginator(
+        entries,
+        settings.POST_LIMIT,
+        pull_authors=followed_pull_authors(request.user),
+    ).get_page(request.GET.get('cursor'))
+    context = {
+        'page_obj': page_obj,
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': cache_version('feed', f'follow:{request.user.pk}'),
+    }
     return render(request, 'posts/follow.html', context)
 
 
+def search_posts(request):
+    form = SearchForm(request.GET or None)
+    page_obj = None
+    if form.is_valid():
+        posts = search(
+            form.cleaned_data['q'],
+            group=form.cleaned_data['group'],
+            author=form.cleaned_data['author'],
+        ).select_related('author', 'group')
+        # Релевантность зависит от частот термов, меняющихся между
+        # запросами, поэтому выдача листается по номерам страниц,
+        # а не курсором по плавающему ключу
+        page_obj = WindowedPaginator(
+            posts, settings.POSTS_ON_PAGE).get_page(request.GET.get('page'))
+    # Ссылки пагинатора сохраняют параметры запроса
+    query = request.GET.copy()
+    query.pop('page', None)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'query_prefix': f'{query.urlencode()}&' if query else '',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def autocomplete_names(request):
+    results = autocomplete.suggest(request.GET.get('q', '').strip())
+    return JsonResponse({'results': results})
+
+
+def resize_image(request, signature, geometry, path):
+    width, height = parse_geometry(signature, geometry, path)
+    return serve(path, width, height)
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
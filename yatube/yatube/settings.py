@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 
 EMPTY_VALUE_DISPLAY = '-пусто-'
 
@@ -41,6 +43,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RequestCoalescingMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
 ]
 
@@ -117,7 +120,64 @@ EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_ON_PAGE: int = 10
+COMMENTS_ON_PAGE: int = 20
 POST_LIMIT: int = 15
+TIMELINE_BATCH_SIZE: int = 1000
+PAGINATOR_WINDOW: int = 3
+# Фрагменты сбрасываются версиями областей, поэтому живут долго
+FRAGMENT_CACHE_TIMEOUT: int = 60 * 60 * 24
+PAGE_CACHE_TIMEOUT: int = 60 * 60 * 24
+# Склейка одинаковых одновременных запросов гостей
+COALESCE_WAIT_TIMEOUT: float = 5.0
+COALESCE_LOCK_TIMEOUT: int = 30
+COALESCE_RESULT_TIMEOUT: int = 10
+# Защита от одновременного пересчета фрагментов
+FRAGMENT_STALE_TIMEOUT: int = 60
+FRAGMENT_LOCK_TIMEOUT: int = 10
+FRAGMENT_WAIT_TIMEOUT: float = 2.0
+FRAGMENT_EARLY_BETA: float = 1.0
+# Загруженные картинки вписываются в этот размер и перекодируются
+IMAGE_MAX_SIZE: int = 2048
+IMAGE_MAX_PIXELS: int = 40_000_000
+IMAGE_FORMAT: str = 'JPEG'
+IMAGE_QUALITY: int = 85
+# Миниатюры постов, генерируемые в фоне после загрузки картинки
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Варианты миниатюр для srcset: форматы в порядке предпочтения
+# (последний - запасной для <img>) и ширины
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_SIZES = '(max-width: 992px) 100vw, 960px'
+THUMBNAIL_WORKERS: int = 2
+# Уменьшение картинок по подписанным ссылкам /media/resize/
+RESIZE_MAX_SIZE: int = 2048
+RESIZE_WORKERS: int = 2
+RESIZE_QUEUE_LIMIT: int = 8
+RESIZE_TIMEOUT: int = 10
+RESIZE_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'yatube_resize')
+RESIZE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+# Префикс internal-location nginx; пусто - файл отдает Django
+RESIZE_ACCEL_REDIRECT = ''
+# Подсказки имен пользователей и групп из индекса в памяти процесса
+AUTOCOMPLETE_LIMIT: int = 10
+AUTOCOMPLETE_REFRESH: int = 60 * 5
+# Массовые действия в админке: размер пачки и порог фонового запуска
+BULK_CHUNK_SIZE: int = 500
+BULK_BACKGROUND_THRESHOLD: int = 1000
+BULK_PROGRESS_TIMEOUT: int = 60 * 60 * 24
+# Фоновая операция без отчета о ходе дольше этого считается потерянной
+BULK_STALE_TIMEOUT: int = 60 * 10
+PAGINATOR_COUNT_TIMEOUT: int = 60 * 10
+# Выше этой оценки страницы считаются без точного COUNT(*)
+PAGINATOR_EXACT_COUNT_LIMIT: int = 100000
+# Посты авторов с таким числом подписчиков не раскладываются по лентам;
+# обратно автор переводится, когда подписчиков меньше FEED_PUSH_THRESHOLD
+FEED_PULL_THRESHOLD: int = 10000
+FEED_PUSH_THRESHOLD: int = 8000
+FEED_PULL_CACHE_SIZE: int = 200
+FEED_PULL_CACHE_TIMEOUT: int = 60 * 60
 
 USER_NAME = 'TestAuthor'
 GROUP_TITLE = 'Тестовая группа'
@@ -132,6 +192,28 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
+        'BACKEND': 'core.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 1000,
+            'LOCAL_TIMEOUT': 5,
+            'BYPASS_PREFIXES': ('version:', 'modified:', 'coalesce:',
+                                'bulk:'),
+        },
+    },
+    # Общий для всех процессов уровень кэша. FileBasedCache годится
+    # только для разработки: add и incr в нем не атомарны, а на них
+    # держатся блокировки и версии кэша. В продакшене здесь нужен
+    # Memcached или Redis.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube_cache'),
+    },
+}
+# Тесты не должны видеть кэш сервера разработки и оставлять в нем записи
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    CACHES['shared'] = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-tests',
     }
-}